@@ -1,59 +1,436 @@
+import os
 import sys
-import pandas as pd
+import time
 import numpy as np
 
 # Import custom modules
+# ML (scikit-learn, scipy) and plotting (matplotlib, seaborn) modules are imported on the
+# code paths that use them, so --decision only pays for the parser and the Analyzer.
 from cli_parser import CLIParser
-from vasp_parser import VaspParser
+from vasp_parser import VaspTailParser, detect_format, iter_chunks, parse_file, read_atom_types
 from force_analysis import Analyzer
-from visualizer import Visualizer
-from force_ml import MLModel, StructureGenerator
-from poscar_io import PoscarWriter
 from decision_module import RelaxationDecision
+from parse_cache import ParseCache
+from trajectory import Trajectory
+from profiling import profiler
+
+def _parse_files(files, jobs=1, stream=False, cache=None, last_step_only=False):
+    """
+    Yields (filepath, loader) in input order; calling loader() returns the parsed
+    arrays or raises that file's error. With jobs > 1 files are parsed in worker processes.
+    """
+    if jobs < 0:
+        jobs = os.cpu_count()
+    if jobs <= 1:
+        for f in files:
+            yield f, (lambda f=f: parse_file(f, stream=stream, cache=cache, last_step_only=last_step_only))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(parse_file, f, stream, cache, last_step_only) for f in files]
+        for f, future in zip(files, futures):
+            yield f, future.result
+
+def watch(args):
+    """
+    Follows vasprun.xml files that are still being written. Each poll decodes only the newly
+    appended ionic steps and re-runs the convergence check on them.
+    Only vasprun.xml can be followed; an OUTCAR input is an error.
+    """
+    outcars = [f for f in args.files if os.path.isfile(f) and detect_format(f) == 'outcar']
+    if outcars:
+        print(f"Error: --watch follows vasprun.xml files only; OUTCAR given: {', '.join(outcars)}")
+        sys.exit(1)
+
+    parsers = []
+    for f in args.files:
+        try:
+            parsers.append(VaspTailParser(f))
+        except Exception as e:
+            print(f"Error reading {f}: {e}")
+
+    if not parsers:
+        print("No valid data found.")
+        sys.exit(1)
+
+    analyzer = None
+    suggested_isif = None
+
+    print(f"--- Watching {len(parsers)} file(s) every {args.watch_interval}s ---")
+    while True:
+        new_steps = False
+        for vp in parsers:
+            try:
+                traj = vp.extract_trajectory()
+            except Exception as e:
+                print(f"Error reading {vp.filepath}: {e}")
+                continue
+            if traj.n_steps > 0:
+                new_steps = True
+                if analyzer is None:
+                    analyzer = Analyzer(traj)
+                else:
+                    analyzer.append(traj)
+                print(f"{vp.filepath}: +{traj.n_steps} steps (total {vp.step_offset})")
+
+        if new_steps:
+
+            if args.decision:
+                decider = RelaxationDecision(analyzer, force_thresh=args.f_tol, pressure_thresh=args.p_tol)
+                exit_code, suggested_isif = decider.evaluate()
+                if exit_code == 0:
+                    print("Structure Converged. Exiting 0.")
+                    sys.exit(0)
+            else:
+                conv = analyzer.check_convergence(force_thresh=args.f_tol)
+                print(f"Max Force (last step): {conv['max_force']:.4f} (converged: {conv['converged']})")
+
+        if all(vp.finished for vp in parsers):
+            break
+        time.sleep(args.watch_interval)
+
+    print("All watched runs finished.")
+    if args.decision and suggested_isif is not None:
+        print(f"Structure NOT Converged. Next ISIF: {suggested_isif}")
+        sys.exit(suggested_isif)
+
+def scan_campaign(args):
+    """
+    Evaluates every vasprun.xml below the given directories as an independent run and writes
+    one table row per run (final max force, pressure, energy, steps, suggested ISIF).
+    """
+    from campaign import scan, write_table
+
+    print(f"--- Scanning {', '.join(args.files)} ---")
+    table = scan(args.files, jobs=args.jobs, force_thresh=args.f_tol, pressure_thresh=args.p_tol)
+    if table.empty:
+        print("No vasprun.xml files found.")
+        sys.exit(1)
+
+    write_table(table, args.scan_output)
+    failed = table['error'].notna()
+    converged = table['converged'].fillna(False).astype(bool)
+    print(f"Runs: {len(table)}, converged: {converged.sum()}, not converged: {(~converged & ~failed).sum()}, errors: {failed.sum()}")
+    isif = table.loc[~converged & ~failed, 'suggested_isif'].value_counts().sort_index()
+    for value, count in isif.items():
+        print(f"  Next ISIF {value}: {count} run(s)")
+    print(f"Saved {args.scan_output}")
+
+def _template(traj):
+    """Template for generated structures: the final step of traj with its cell and POSCAR species line."""
+    atom_types, counts = [], []
+    for symbol in traj.symbols:
+        if atom_types and atom_types[-1] == symbol:
+            counts[-1] += 1
+        else:
+            atom_types.append(symbol)
+            counts.append(1)
+    return {
+            'lattice': traj.lattice,
+            'elements': list(traj.symbols),
+            'positions': np.array(traj.positions[-1]),
+            'atom_types': atom_types,
+            'counts': counts,
+            'coordinate_type': traj.coordinate_type
+            }
+
+def _model(args, trajectories, species=None):
+    """MLModel with the hyperparameters from the command line."""
+    from force_ml import MLModel
+
+    return MLModel(
+            trajectories,
+            n_estimators=args.n_estimators,
+            max_depth=args.max_depth,
+            min_samples_split=args.min_samples_split,
+            features=args.features,
+            cutoff=args.cutoff,
+            n_jobs=args.jobs,
+            species=species
+            )
+
+def generate_structures(args, ml, template, suggested_isif=None):
+    """Relaxes --generate perturbed copies of the template with the model and writes them (--gen-format)."""
+    from force_ml import StructureGenerator
+    from poscar_io import PoscarWriter
+
+    if template is None:
+        print("Error: No template structure found.")
+        return
+    lattice, elements, coordinate_type = template['lattice'], template['elements'], template['coordinate_type']
+    if args.compiled_rows > 0:
+        with profiler.stage('compile'):
+            ml.compile(template['positions'], elements, lattice, coordinate_type, max_rows=args.compiled_rows)
+    gen = StructureGenerator(ml, template['positions'], elements, lattice)
+
+    # Pass Generation Parameters from CLI
+    with profiler.stage('generate', rows=args.generate * len(elements)):
+        new_structs = gen.generate_zero_force_structures(
+                args.generate,
+                coordinate_system=coordinate_type,
+                steps=args.steps,
+                learning_rate=args.learning_rate,
+                noise_level=args.noise_level,
+                optimizer=args.optimizer,
+                fmax=args.fmax,
+                max_step=args.max_step
+                )
+
+    # Determine title suffix based on decision
+    suffix = f"ISIF_{suggested_isif}" if suggested_isif else "Optimized"
+
+    titles = [f"ML_Gen_{idx}_{suffix}" for idx in range(len(new_structs))]
+    names = [f"POSCAR_generated_{idx}.vasp" for idx in range(len(new_structs))]
+    with profiler.stage('write', rows=len(new_structs)):
+        if args.gen_format == 'xdatcar':
+            PoscarWriter.write_xdatcar(args.gen_output or "XDATCAR_generated", lattice, new_structs,
+                                       template['atom_types'], template['counts'],
+                                       coordinate_system=coordinate_type, title=f"ML_Gen_{suffix}")
+        elif args.gen_format == 'tar':
+            PoscarWriter.write_archive(args.gen_output or "POSCAR_generated.tar.gz", names, lattice,
+                                       new_structs, template['atom_types'], template['counts'],
+                                       coordinate_system=coordinate_type, titles=titles)
+        else:
+            if args.gen_output:
+                os.makedirs(args.gen_output, exist_ok=True)
+                names = [os.path.join(args.gen_output, name) for name in names]
+            PoscarWriter.write_many(names, lattice, new_structs, template['atom_types'], template['counts'],
+                                    coordinate_system=coordinate_type, titles=titles, jobs=args.jobs)
+
+def run_sampled(args, cache=None):
+    """
+    --sample-rows: a single chunked pass over the files (see vasp_parser.iter_chunks) feeds the
+    training reservoir, the streaming statistics and the per-step summary for --plot, so no run
+    is ever held in memory as a whole. Only the final step of the last file is kept as template.
+    """
+    import pandas as pd
+    from online_stats import TrajectoryStats
+
+    species = []
+    for f in args.files:
+        try:
+            species += [t for t in read_atom_types(f, cache) if t not in species]
+        except Exception as e:
+            print(f"Error reading {f}: {e}")
+
+    stats = TrajectoryStats()
+    summaries = []
+    state = {'template': None, 'rows': 0}
+
+    def chunks():
+        for f in args.files:
+            rows = 0
+            try:
+                for chunk in iter_chunks(f, args.chunk_steps, cache):
+                    if chunk.n_steps == 0:
+                        continue
+                    stats.update(chunk)
+                    summaries.append(chunk.step_summary())
+                    state['template'] = _template(chunk)
+                    rows += chunk.n_steps * chunk.n_atoms
+                    yield chunk
+            except Exception as e:
+                print(f"Error reading {f}: {e}")
+                continue
+            state['rows'] += rows
+            print(f"Loaded {f}: {rows} entries")
+
+    print("--- Parsing Files (sampled training) ---")
+    ml = _model(args, [], species)
+    with profiler.stage('train') as stage:
+        try:
+            ml.train_sampled(chunks(), max_rows=args.sample_rows)
+        except ValueError as e:
+            print(e)
+            print("No valid data found.")
+            sys.exit(1)
+        stage.rows = state['rows']
+
+    print("\n--- Statistics ---")
+    with profiler.stage('statistics'):
+        print_statistics(stats)
+
+    if args.save_model:
+        ml.save(args.save_model)
+
+    if args.generate > 0:
+        generate_structures(args, ml, state['template'])
+
+    if args.plot or args.plot_dir:
+        from visualizer import Visualizer
+
+        summary = pd.concat(summaries, ignore_index=True)
+        print("\n--- Visualizing ---")
+        with profiler.stage('plot', rows=len(summary)):
+            viz = Visualizer(summary, output_dir=args.plot_dir, fmt=args.plot_format)
+            viz.render_all(jobs=args.jobs)
+
+def print_statistics(stats):
+    """Prints the statistics tables of an Analyzer or an online_stats.TrajectoryStats."""
+    print(stats.force_stats())
+    print("\nDrift Stats (Sum of Forces):")
+    print(stats.drift_stats())
+
+    print("\nTotal Energy Stats:")
+    print(stats.energy_stats())
+
+    if stats.has_stress:
+        print("\nPressure Stats:")
+        print(stats.pressure_stats())
+        print("\nStress Tensor Stats:")
+        print(stats.stress_stats())
+
+def stream_statistics(args, cache=None):
+    """
+    --online-stats without any stage that needs the full trajectories: every file is read in
+    chunks of --chunk-steps steps into a TrajectoryStats (in worker processes with --jobs) and
+    the per-file accumulators are merged, so memory does not grow with the number of steps.
+    """
+    from online_stats import TrajectoryStats, file_stats
+
+    print("--- Parsing Files (streaming statistics) ---")
+    total = TrajectoryStats()
+    jobs = os.cpu_count() if args.jobs < 0 else args.jobs
+    with profiler.stage('parse') as stage:
+        if jobs <= 1:
+            results = ((f, lambda f=f: file_stats(f, args.chunk_steps, cache)) for f in args.files)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(max_workers=jobs)
+            results = [(f, pool.submit(file_stats, f, args.chunk_steps, cache).result) for f in args.files]
+        rows = 0
+        try:
+            for f, load in results:
+                try:
+                    stats, n = load()
+                    total.merge(stats)
+                    rows += n
+                    print(f"Loaded {f}: {n} entries")
+                except Exception as e:
+                    print(f"Error reading {f}: {e}")
+        finally:
+            if jobs > 1:
+                pool.shutdown()
+        stage.rows = rows
+
+    if rows == 0:
+        print("No valid data found.")
+        sys.exit(1)
+
+    print("\n--- Statistics ---")
+    with profiler.stage('statistics'):
+        print_statistics(total)
+
+def search_hyperparameters(args, ml):
+    """--search: prints (and optionally writes) the ranked CV table and sets the best configuration on ml."""
+    from model_search import best_parameters, grid, search
+
+    candidates = grid(args.search_n_estimators, args.search_max_depth, args.search_min_samples_split)
+    table = search(ml, candidates, folds=args.cv_folds, jobs=args.jobs, group_by=args.cv_group, margin=args.search_margin)
+    print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.search_output:
+        if args.search_output.endswith('.json'):
+            table.reset_index().to_json(args.search_output, orient='records', indent=2)
+        else:
+            table.to_csv(args.search_output)
+        print(f"Saved {args.search_output}")
+
+    best = best_parameters(table)
+    ml.n_estimators, ml.max_depth, ml.min_samples_split = best['n_estimators'], best['max_depth'], best['min_samples_split']
+    print(f"Best configuration: n_estimators={ml.n_estimators}, max_depth={ml.max_depth}, "
+          f"min_samples_split={ml.min_samples_split} (mean R2 {table['mean_r2'].iloc[0]:.4f})")
+
+def write_profile(args):
+    """Writes the --profile JSON report, prints the stage table and dumps any cProfile results."""
+    profiler.write(args.profile)
+    print("\n--- Profile ---")
+    profiler.print_summary()
+    print(f"Saved {args.profile}")
+
+    import pstats
+    for stage, hooks in profiler.hook_results.items():
+        stats = pstats.Stats(*hooks)
+        path = f"{os.path.splitext(args.profile)[0]}.{stage}.prof"
+        stats.dump_stats(path)
+        print(f"\ncProfile of stage '{stage}' (saved {path}):")
+        stats.sort_stats('cumulative').print_stats(15)
 
 def main():
     # 1. Parse Arguments
     cli = CLIParser()
     args = cli.parse()
 
+    if args.profile:
+        profiler.enable()
+        if args.profile_stage:
+            import cProfile
+            profiler.attach(args.profile_stage, cProfile.Profile)
+
+    try:
+        run(args)
+    finally:
+        # Also reached through sys.exit() in the decision path
+        if args.profile:
+            write_profile(args)
+
+def run(args):
+    if args.watch:
+        watch(args)
+        return
+
+    if args.scan:
+        scan_campaign(args)
+        return
+
     # 2. Load Data
-    all_data = []
+    trajectories = []
+
+    # Template for generated structures: the final step of the last file
+    template = None
+
+    cache = None
+    if not args.no_cache:
+        cache = ParseCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024**2), content_hash=args.cache_hash)
 
-    last_lattice = None
-    last_elements = None
-    last_positions = None
-    last_counts = None
-    last_unique_elements = None
-    detected_coord_type = "Direct"
+    # --decision exits right after evaluating the final ionic step, so for a single run only that
+    # step is decoded. With several files the decision compares step indices across runs, which
+    # needs the full trajectories.
+    last_step_only = args.decision and len(args.files) == 1
+
+    if args.online_stats and not (args.ml or args.generate > 0 or args.plot or args.decision):
+        stream_statistics(args, cache)
+        return
+
+    if args.sample_rows and (args.ml or args.generate > 0) and not (args.decision or args.load_model):
+        run_sampled(args, cache)
+        return
 
     print("--- Parsing Files ---")
-    for f in args.files:
-        try:
-            vp = VaspParser(f)
-            df = vp.extract_data()
-            if not df.empty:
-                all_data.append(df)
-
-                last_lattice = vp.extract_basis()
-                last_step_idx = df['step'].max()
-                last_step_df = df[df['step'] == last_step_idx]
-
-                last_elements = last_step_df['element'].tolist()
-                last_positions = last_step_df[['x','y','z']].values
-                last_unique_elements = vp.atom_types
-                last_counts = vp.counts
-                detected_coord_type = vp.coordinate_type
-
-                print(f"Loaded {f}: {len(df)} entries (Coords: {vp.coordinate_type})")
-        except Exception as e:
-            print(f"Error reading {f}: {e}")
+    with profiler.stage('parse') as stage:
+        for f, load in _parse_files(args.files, jobs=args.jobs, stream=args.stream, cache=cache, last_step_only=last_step_only):
+            try:
+                parsed = load()
+                traj = Trajectory.from_parsed(parsed)
+                if traj.n_steps > 0:
+                    trajectories.append(traj)
 
-    if not all_data:
+                    # Files are consumed in input order, so the template is always the last file's final step
+                    template = _template(traj)
+
+                    print(f"Loaded {f}: {traj.n_steps * traj.n_atoms} entries (Coords: {traj.coordinate_type})")
+            except Exception as e:
+                print(f"Error reading {f}: {e}")
+        stage.rows = sum(t.n_steps * t.n_atoms for t in trajectories)
+
+    if not trajectories:
         print("No valid data found.")
         sys.exit(1)
 
-    combined_df = pd.concat(all_data, ignore_index=True)
-    analyzer = Analyzer(combined_df)
+    with profiler.stage('analysis', rows=sum(t.n_steps for t in trajectories)):
+        analyzer = Analyzer(trajectories, online=args.online_stats)
 
     # Initialize suggested_isif to avoid naming errors if decision is skipped
     suggested_isif = None
@@ -61,8 +438,9 @@ def main():
     # 3. Decision Module (Optional)
     if args.decision:
         print("\n--- Convergence Decision ---")
-        decider = RelaxationDecision(analyzer, force_thresh=args.f_tol, pressure_thresh=args.p_tol)
-        exit_code, suggested_isif = decider.evaluate()
+        with profiler.stage('decision'):
+            decider = RelaxationDecision(analyzer, force_thresh=args.f_tol, pressure_thresh=args.p_tol)
+            exit_code, suggested_isif = decider.evaluate()
 
         if exit_code == 0:
             print("Structure Converged. Exiting 0.")
@@ -73,70 +451,43 @@ def main():
 
     # 4. Analysis Output
     print("\n--- Statistics ---")
-    print(analyzer.force_stats())
-    print("\nDrift Stats (Sum of Forces):")
-    print(analyzer.drift_stats())
-
-    if 'energy' in combined_df.columns:
-        print("\nTotal Energy Stats:")
-        print(analyzer.energy_stats())
-
-    if 'pressure' in combined_df.columns:
-        print("\nPressure Stats:")
-        print(analyzer.pressure_stats())
-        print("\nStress Tensor Stats:")
-        print(analyzer.stress_stats())
+    with profiler.stage('statistics', rows=len(analyzer.summary)):
+        print_statistics(analyzer)
 
     # 5. Machine Learning & Generation
     if args.ml or args.generate > 0:
         print("\n--- Machine Learning ---")
+        ml = _model(args, trajectories)
+        if args.search:
+            with profiler.stage('search'):
+                search_hyperparameters(args, ml)
 
-        # Pass Hyperparameters from CLI
-        ml = MLModel(
-                combined_df,
-                n_estimators=args.n_estimators,
-                max_depth=args.max_depth,
-                min_samples_split=args.min_samples_split
-                )
-        ml.train()
+        with profiler.stage('train'):
+            if args.load_model:
+                ml.load(args.load_model)
+                if ml.meta['coordinate_type'] != template['coordinate_type']:
+                    print(f"Warning: model was trained on {ml.meta['coordinate_type']} coordinates, input is {template['coordinate_type']}")
+            else:
+                # Reuse a model trained on identical data and hyperparameters when available; cached models
+                # count towards --cache-max-mb together with the parsed trajectories
+                ml.train(cache_dir=None if cache is None else cache.model_dir)
+                if cache is not None:
+                    cache.evict()
+
+        if args.save_model:
+            ml.save(args.save_model)
 
         if args.generate > 0:
-            if last_positions is None:
-                print("Error: No template structure found.")
-            else:
-                gen = StructureGenerator(ml, last_positions, last_elements, last_lattice)
-
-                # Pass Generation Parameters from CLI
-                new_structs = gen.generate_zero_force_structures(
-                        args.generate,
-                        coordinate_system=detected_coord_type,
-                        steps=args.steps,
-                        learning_rate=args.learning_rate,
-                        noise_level=args.noise_level
-                        )
-
-                # Determine title suffix based on decision
-                suffix = f"ISIF_{suggested_isif}" if suggested_isif else "Optimized"
-
-                for idx, pos in enumerate(new_structs):
-                    fname = f"POSCAR_generated_{idx}.vasp"
-                    PoscarWriter.write(
-                            fname,
-                            last_lattice,
-                            pos,
-                            last_unique_elements,
-                            last_counts,
-                            coordinate_system=detected_coord_type,
-                            title=f"ML_Gen_{idx}_{suffix}"
-                            )
+            generate_structures(args, ml, template, suggested_isif)
 
     # 6. Visualization
-    if args.plot:
+    if args.plot or args.plot_dir:
+        from visualizer import Visualizer
+
         print("\n--- Visualizing ---")
-        viz = Visualizer(combined_df)
-        viz.plot_trajectory()
-        viz.plot_stress_distribution()
-        viz.plot_extended_diagnostics()
+        with profiler.stage('plot', rows=len(analyzer.summary)):
+            viz = Visualizer(analyzer.summary, output_dir=args.plot_dir, fmt=args.plot_format)
+            viz.render_all(jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
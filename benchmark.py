@@ -0,0 +1,440 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from vasp_parser import VaspParser, parse_file
+from parse_cache import ParseCache
+from force_ml import MLModel, StructureGenerator
+from force_analysis import Analyzer
+from decision_module import RelaxationDecision
+from poscar_io import PoscarWriter
+from compression import COMPRESSED, open_input
+from outcar_parser import OutcarParser
+from synthetic_vasprun import write_outcar, write_vasprun
+
+def _legacy_extract_data(vp):
+    """Reference implementation: per-row float conversion and one DataFrame per step."""
+    def extract_varray(parent_node, name):
+        varray = parent_node.find(f"./varray[@name='{name}']")
+        if varray is None:
+            struct = parent_node.find('structure')
+            if struct:
+                varray = struct.find(f"./varray[@name='{name}']")
+        if varray is not None:
+            return np.array([[float(x) for x in v.text.split()] for v in varray.findall('v')])
+        return None
+
+    data = []
+    for i, calc in enumerate(vp.iter_calculations()):
+        forces = extract_varray(calc, 'forces')
+        positions = extract_varray(calc, 'positions')
+        stress = extract_varray(calc, 'stress')
+
+        energy_val = None
+        energy_block = calc.find('energy')
+        if energy_block is not None:
+            e_node = energy_block.find("./i[@name='e_fr_energy']")
+            if e_node is not None:
+                energy_val = float(e_node.text.strip())
+
+        if forces is None or positions is None or len(positions) != len(vp.symbols):
+            continue
+
+        df_step = pd.DataFrame(positions, columns=['x', 'y', 'z'])
+        df_step[['fx', 'fy', 'fz']] = forces
+        df_step['element'] = vp.symbols
+        df_step['step'] = i
+        df_step['file_source'] = vp.filepath
+        df_step['energy'] = energy_val
+        if stress is not None:
+            df_step['pressure'] = -np.mean(np.diag(stress))
+            df_step['stress_xx'] = stress[0,0]
+            df_step['stress_yy'] = stress[1,1]
+            df_step['stress_zz'] = stress[2,2]
+        data.append(df_step)
+
+    return pd.concat(data, ignore_index=True) if data else pd.DataFrame()
+
+def _best_of(func, repeat):
+    """Returns (best wall time in seconds, last result) over `repeat` runs."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def bench_parse(filepath, repeat=3):
+    """Compares legacy and vectorized extract_data on an already-loaded tree."""
+    vp = VaspParser(filepath)
+
+    t_legacy, df_legacy = _best_of(lambda: _legacy_extract_data(vp), repeat)
+    t_fast, df_fast = _best_of(vp.extract_data, repeat)
+
+    numeric = ['x', 'y', 'z', 'fx', 'fy', 'fz']
+    identical = len(df_legacy) == len(df_fast) and np.allclose(df_legacy[numeric].values, df_fast[numeric].values)
+
+    print(f"File: {filepath} ({len(df_fast)} rows)")
+    print(f"  legacy extract_data:     {t_legacy:.4f} s")
+    print(f"  vectorized extract_data: {t_fast:.4f} s")
+    print(f"  speedup: {t_legacy / t_fast:.1f}x (results identical: {identical})")
+    return {'legacy': t_legacy, 'vectorized': t_fast, 'rows': len(df_fast)}
+
+def bench_outcar(vasprun=None, outcar=None, n_atoms=64, n_steps=1000, repeat=3):
+    """
+    XML vs OUTCAR reading of the same run. Without files, a synthetic run is written in both formats.
+    Positions are compared in Cartesian coordinates (OUTCAR prints 5 decimals, forces 6).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if vasprun is None or outcar is None:
+            vasprun = os.path.join(tmp, 'vasprun.xml')
+            outcar = os.path.join(tmp, 'OUTCAR')
+            write_vasprun(vasprun, n_atoms=n_atoms, species=('Si', 'O'), n_steps=n_steps)
+            write_outcar(outcar, n_atoms=n_atoms, species=('Si', 'O'), n_steps=n_steps)
+
+        t_xml, xml = _best_of(lambda: VaspParser(vasprun).extract_arrays(), repeat)
+        t_out, out = _best_of(lambda: OutcarParser(outcar).extract_arrays(), repeat)
+        basis = VaspParser(vasprun).extract_basis()
+
+        cartesian = xml['positions'] @ basis if np.max(np.abs(xml['positions'])) <= 1.5 else xml['positions']
+        same_shape = xml['forces'].shape == out['forces'].shape
+        agree = same_shape and np.allclose(xml['forces'], out['forces'], atol=1e-5) \
+            and np.allclose(cartesian, out['positions'], atol=1e-4)
+
+        print(f"{len(xml['steps'])} steps x {xml['forces'].shape[1]} atoms "
+              f"(vasprun.xml {os.path.getsize(vasprun) / 1024**2:.1f} MB, OUTCAR {os.path.getsize(outcar) / 1024**2:.1f} MB)")
+        print(f"  VaspParser.extract_arrays:   {t_xml:.4f} s")
+        print(f"  OutcarParser.extract_arrays: {t_out:.4f} s")
+        print(f"  speedup: {t_xml / t_out:.1f}x (positions/forces agree: {agree})")
+    return {'xml': t_xml, 'outcar': t_out, 'agree': bool(agree)}
+
+def _drain(filepath, prefetch):
+    """Reads a file to the end through open_input; returns the decompressed size."""
+    size = 0
+    with open_input(filepath, prefetch=prefetch) as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                return size
+            size += len(chunk)
+
+def bench_compressed(vasprun=None, n_atoms=64, n_steps=1000, repeat=3):
+    """
+    Reading a vasprun.xml plain and as .gz/.bz2/.xz copies: decompression alone (with and without
+    the prefetch thread) and the full VaspParser.extract_arrays. Without a file a synthetic run is written.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if vasprun is None:
+            vasprun = os.path.join(tmp, 'vasprun.xml')
+            write_vasprun(vasprun, n_atoms=n_atoms, species=('Si', 'O'), n_steps=n_steps)
+        with open(vasprun, 'rb') as f:
+            raw = f.read()
+        files = {'plain': vasprun}
+        for ext, module in COMPRESSED.items():
+            files[ext] = os.path.join(tmp, 'vasprun.xml' + ext)
+            with module.open(files[ext], 'wb') as f:
+                f.write(raw)
+
+        t_ref, ref = _best_of(lambda: VaspParser(vasprun).extract_arrays(), repeat)
+        print(f"{len(ref['steps'])} steps x {ref['forces'].shape[1]} atoms, {len(raw) / 1024**2:.1f} MB of XML")
+        print(f"{'input':>6} {'disk MB':>8} {'read (s)':>9} {'prefetch (s)':>13} {'parse (s)':>10} {'MB/s':>7}  identical")
+        results = {}
+        for name, path in files.items():
+            t_read, size = _best_of(lambda: _drain(path, prefetch=False), repeat)
+            t_prefetch, _ = _best_of(lambda: _drain(path, prefetch=True), repeat)
+            t_parse, out = (t_ref, ref) if name == 'plain' else _best_of(lambda: VaspParser(path).extract_arrays(), repeat)
+            identical = np.array_equal(out['forces'], ref['forces']) and np.array_equal(out['positions'], ref['positions'])
+            disk = os.path.getsize(path)
+            print(f"{name:>6} {disk / 1024**2:8.1f} {t_read:9.4f} {t_prefetch:13.4f} {t_parse:10.4f} "
+                  f"{size / 1024**2 / t_parse:7.1f}  {identical}")
+            results[name] = {'disk_bytes': disk, 'bytes': size, 'read': t_read, 'read_prefetch': t_prefetch,
+                             'parse': t_parse, 'identical': bool(identical)}
+    return results
+
+def bench_predict(n_atoms=64, n_steps=200, batch_sizes=(1, 4, 16, 64, 256), n_estimators=100, features="xyz", repeat=5):
+    """
+    Latency of MLModel.predict_forces_batch through the sklearn pipeline and through the
+    CompiledForest, per batch size (structures of n_atoms atoms), on a model trained on a synthetic run.
+    Reports whether both give bit-identical forces.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'vasprun.xml')
+        write_vasprun(path, n_atoms=n_atoms, species=('Si', 'O'), n_steps=n_steps)
+        traj = VaspParser(path).extract_trajectory()
+
+    ml = MLModel([traj], n_estimators=n_estimators, features=features)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ml.train()
+        ml.compile(max_rows=np.inf)
+    compiled = ml.compiled
+    print(f"Forest: {n_estimators} trees, {len(compiled.threshold)} nodes, features {features}, {n_atoms} atoms per structure")
+    print(f"{'structures':>10} {'rows':>7} {'pipeline (ms)':>14} {'compiled (ms)':>14} {'speedup':>8}  identical")
+
+    results = []
+    rng = np.random.default_rng(0)
+    for batch in batch_sizes:
+        frames = traj.positions[rng.integers(0, traj.n_steps, batch)]
+        ml.compiled = None
+        t_pipe, ref = _best_of(lambda: ml.predict_forces_batch(frames, traj.symbols, traj.lattice, traj.coordinate_type), repeat)
+        ml.compiled = compiled
+        t_comp, out = _best_of(lambda: ml.predict_forces_batch(frames, traj.symbols, traj.lattice, traj.coordinate_type), repeat)
+        identical = np.array_equal(ref, out)
+        print(f"{batch:>10} {batch * n_atoms:>7} {t_pipe * 1e3:>14.2f} {t_comp * 1e3:>14.2f} {t_pipe / t_comp:>7.1f}x  {identical}")
+        results.append({'structures': batch, 'rows': batch * n_atoms, 'pipeline': t_pipe, 'compiled': t_comp,
+                        'identical': bool(identical)})
+    return results
+
+def bench_cache(files):
+    """Times a cold parse (cache fill) against a warm run served from the parse cache."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParseCache(cache_dir)
+
+        t0 = time.perf_counter()
+        for f in files:
+            parse_file(f, cache=cache)
+        t_cold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for f in files:
+            parse_file(f, cache=cache)
+        t_warm = time.perf_counter() - t0
+
+    print(f"{len(files)} files: cold {t_cold:.4f} s, warm (cached) {t_warm:.4f} s, speedup {t_cold / t_warm:.1f}x")
+    return {'cold': t_cold, 'warm': t_warm}
+
+def bench_train(files, jobs_list=None, n_estimators=100):
+    """Times MLModel.train on the given files for increasing core counts."""
+    trajectories = [VaspParser(f).extract_trajectory() for f in files]
+    if jobs_list is None:
+        jobs_list = sorted({1, 2, 4, 8, 16, 32, 64, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+
+    results = {}
+    for jobs in jobs_list:
+        ml = MLModel(trajectories, n_estimators=n_estimators, n_jobs=jobs)
+        t0 = time.perf_counter()
+        ml.train()
+        results[jobs] = time.perf_counter() - t0
+
+    print(f"{'Jobs':>5} {'Time (s)':>10} {'Speedup':>8}")
+    for jobs, t in results.items():
+        print(f"{jobs:>5} {t:>10.3f} {results[jobs_list[0]] / t:>8.2f}")
+    return results
+
+HEAVY_MODULES = ['sklearn', 'scipy', 'matplotlib', 'seaborn', 'joblib']
+
+def bench_startup(files, repeat=5, budget=0.5):
+    """
+    Cold-start wall time of the decision entry point (decide.py) in fresh interpreters.
+    Fails (returns False) if the median exceeds `budget` seconds or a heavy dependency gets imported.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    cmd = [sys.executable, os.path.join(here, 'decide.py'), *files]
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    median = float(np.median(times))
+
+    probe = f"import sys; sys.path.insert(0, {here!r}); import decide; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True).stdout.strip()
+
+    ok = median <= budget and not loaded
+    print(f"decide.py cold start: median {median:.3f} s over {repeat} runs (budget {budget:.3f} s)")
+    print(f"Heavy modules imported: {loaded or 'none'}")
+    print("PASS" if ok else "FAIL")
+    return ok
+
+def measure(stage, func, rows=None):
+    """
+    Runs func once and returns (record, result); record holds wall time, peak traced
+    memory (Python and NumPy allocations via tracemalloc) and optional row throughput.
+    Output printed by func is suppressed.
+    """
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {'stage': stage, 'wall_s': wall, 'peak_mb': peak / 1024**2}
+    if rows is not None:
+        record['rows'] = rows
+        record['rows_per_s'] = rows / wall if wall > 0 else None
+    print(f"  {stage:<32} {wall:>9.4f} s {record['peak_mb']:>9.1f} MB")
+    return record, result
+
+def bench_suite(configs, n_estimators=20, n_generate=10, gen_steps=10, seed=0):
+    """
+    End-to-end timing/peak-memory benchmark on synthetic vasprun.xml files.
+    configs: list of dicts with 'atoms', 'steps' and optionally 'species', 'stress', 'energy'.
+    """
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for cfg in configs:
+            species = cfg.get('species', ['Si', 'O'])
+            path = os.path.join(tmp, f"vasprun_{cfg['atoms']}x{cfg['steps']}.xml")
+            write_vasprun(path, n_atoms=cfg['atoms'], species=species, n_steps=cfg['steps'],
+                          include_stress=cfg.get('stress', True), include_energy=cfg.get('energy', True), seed=seed)
+            rows = cfg['atoms'] * cfg['steps']
+            print(f"Config: {cfg['atoms']} atoms x {cfg['steps']} steps ({os.path.getsize(path) / 1024**2:.1f} MB)")
+
+            records = []
+            def add(stage, func, n=None):
+                record, result = measure(stage, func, n)
+                records.append(record)
+                return result
+
+            vp = add('VaspParser.__init__', lambda: VaspParser(path))
+            add('VaspParser.extract_data', vp.extract_data, rows)
+            traj = add('VaspParser.extract_trajectory', vp.extract_trajectory, rows)
+
+            analyzer = add('Analyzer.__init__', lambda: Analyzer([traj]), rows)
+            for method in ('force_stats', 'drift_stats', 'energy_stats', 'pressure_stats', 'stress_stats', 'check_convergence'):
+                add(f'Analyzer.{method}', getattr(analyzer, method))
+            add('RelaxationDecision.evaluate', RelaxationDecision(analyzer).evaluate)
+
+            ml = MLModel([traj], n_estimators=n_estimators)
+            add('MLModel.train', ml.train, rows)
+            template = traj.positions[-1]
+            add('MLModel.predict_forces', lambda: ml.predict_forces(template, traj.symbols), cfg['atoms'])
+
+            gen = StructureGenerator(ml, template, list(traj.symbols), traj.lattice)
+            np.random.seed(seed)
+            structures = add('StructureGenerator.generate', lambda: gen.generate_zero_force_structures(n_generate, steps=gen_steps))
+
+            types, counts = np.unique(traj.symbols, return_counts=True)
+            names = [os.path.join(tmp, f"POSCAR_{idx}.vasp") for idx in range(len(structures))]
+            add('PoscarWriter.write_many', lambda: PoscarWriter.write_many(names, traj.lattice, structures, list(types), list(counts)),
+                len(structures) * cfg['atoms'])
+
+            runs.append({'config': cfg, 'records': records})
+
+    return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'runs': runs
+            }
+
+def compare_results(current, baseline, tolerance=0.25):
+    """Lists stages whose wall time grew by more than `tolerance` (fraction) against a baseline report."""
+    regressions = []
+    base = {(json.dumps(r['config'], sort_keys=True), rec['stage']): rec
+            for r in baseline['runs'] for rec in r['records']}
+    for run in current['runs']:
+        key_cfg = json.dumps(run['config'], sort_keys=True)
+        for rec in run['records']:
+            old = base.get((key_cfg, rec['stage']))
+            if old and old['wall_s'] > 0 and rec['wall_s'] > old['wall_s'] * (1 + tolerance):
+                regressions.append({'config': run['config'], 'stage': rec['stage'],
+                                    'baseline_s': old['wall_s'], 'current_s': rec['wall_s']})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="VASP AI Toolkit benchmarks")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p_parse = sub.add_parser('parse', help='Legacy vs vectorized vasprun.xml decoding')
+    p_parse.add_argument('files', nargs='+', help='Input vasprun.xml files')
+    p_parse.add_argument('--repeat', type=int, default=3, help='Repetitions (best time is reported)')
+
+    p_outcar = sub.add_parser('outcar', help='vasprun.xml vs OUTCAR reading of the same run')
+    p_outcar.add_argument('--vasprun', default=None, help='vasprun.xml of the run (default: synthetic run)')
+    p_outcar.add_argument('--outcar', default=None, help='OUTCAR of the same run')
+    p_outcar.add_argument('--atoms', type=int, default=64, help='Atoms of the synthetic run')
+    p_outcar.add_argument('--steps', type=int, default=1000, help='Ionic steps of the synthetic run')
+    p_outcar.add_argument('--repeat', type=int, default=3, help='Repetitions (best time is reported)')
+
+    p_comp = sub.add_parser('compressed', help='Plain vs .gz/.bz2/.xz vasprun.xml reading')
+    p_comp.add_argument('--vasprun', default=None, help='vasprun.xml to compress (default: synthetic run)')
+    p_comp.add_argument('--atoms', type=int, default=64, help='Atoms of the synthetic run')
+    p_comp.add_argument('--steps', type=int, default=1000, help='Ionic steps of the synthetic run')
+    p_comp.add_argument('--repeat', type=int, default=3, help='Repetitions (best time is reported)')
+
+    p_pred = sub.add_parser('predict', help='sklearn pipeline vs compiled forest prediction latency')
+    p_pred.add_argument('--atoms', type=int, default=64, help='Atoms per structure')
+    p_pred.add_argument('--steps', type=int, default=200, help='Ionic steps of the synthetic training run')
+    p_pred.add_argument('--batch', type=int, nargs='+', default=[1, 4, 16, 64, 256], help='Structures per call')
+    p_pred.add_argument('--n_estimators', type=int, default=100, help='Number of trees')
+    p_pred.add_argument('--features', choices=['xyz', 'local'], default='xyz', help='Feature set of the model')
+    p_pred.add_argument('--repeat', type=int, default=5, help='Repetitions (best time is reported)')
+
+    p_cache = sub.add_parser('cache', help='Cold parse vs parse-cache hit')
+    p_cache.add_argument('files', nargs='+', help='Input vasprun.xml files')
+
+    p_train = sub.add_parser('train', help='MLModel.train scaling with the number of cores')
+    p_train.add_argument('files', nargs='+', help='Input vasprun.xml files')
+    p_train.add_argument('--jobs', type=int, nargs='+', default=None, help='Core counts to test (default: powers of two up to all cores)')
+    p_train.add_argument('--n_estimators', type=int, default=100, help='Number of trees')
+
+    p_start = sub.add_parser('startup', help='Cold start of the --decision entry point against a time budget')
+    p_start.add_argument('files', nargs='+', help='Input vasprun.xml files')
+    p_start.add_argument('--repeat', type=int, default=5, help='Number of fresh interpreter runs')
+    p_start.add_argument('--budget', type=float, default=0.5, help='Maximum median wall time (s)')
+
+    p_suite = sub.add_parser('suite', help='End-to-end timing/memory suite on synthetic vasprun.xml files')
+    p_suite.add_argument('--atoms', type=int, nargs='+', default=[32, 128], help='Atom counts to test')
+    p_suite.add_argument('--steps', type=int, nargs='+', default=[50, 500], help='Ionic step counts to test')
+    p_suite.add_argument('--species', nargs='+', default=['Si', 'O'], help='Element symbols')
+    p_suite.add_argument('--no-stress', dest='stress', action='store_false', help='Omit stress blocks')
+    p_suite.add_argument('--no-energy', dest='energy', action='store_false', help='Omit energy blocks')
+    p_suite.add_argument('--n_estimators', type=int, default=20, help='Trees for the MLModel stages')
+    p_suite.add_argument('--output', default='bench_results.json', help='JSON results file')
+    p_suite.add_argument('--compare', default=None, help='Baseline JSON results to check for regressions')
+    p_suite.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown against --compare')
+
+    args = parser.parse_args()
+    if args.bench == 'parse':
+        for f in args.files:
+            bench_parse(f, repeat=args.repeat)
+    elif args.bench == 'outcar':
+        bench_outcar(args.vasprun, args.outcar, n_atoms=args.atoms, n_steps=args.steps, repeat=args.repeat)
+    elif args.bench == 'compressed':
+        bench_compressed(args.vasprun, n_atoms=args.atoms, n_steps=args.steps, repeat=args.repeat)
+    elif args.bench == 'predict':
+        bench_predict(args.atoms, args.steps, batch_sizes=args.batch, n_estimators=args.n_estimators,
+                      features=args.features, repeat=args.repeat)
+    elif args.bench == 'cache':
+        bench_cache(args.files)
+    elif args.bench == 'train':
+        bench_train(args.files, jobs_list=args.jobs, n_estimators=args.n_estimators)
+    elif args.bench == 'suite':
+        configs = [{'atoms': a, 'steps': n, 'species': args.species, 'stress': args.stress, 'energy': args.energy}
+                   for a in args.atoms for n in args.steps]
+        results = bench_suite(configs, n_estimators=args.n_estimators)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                regressions = compare_results(results, json.load(f), tolerance=args.tolerance)
+            for r in regressions:
+                print(f"REGRESSION {r['stage']} {r['config']['atoms']}x{r['config']['steps']}: "
+                      f"{r['baseline_s']:.4f} s -> {r['current_s']:.4f} s")
+            if regressions:
+                sys.exit(1)
+    elif args.bench == 'startup':
+        if not bench_startup(args.files, repeat=args.repeat, budget=args.budget):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import pandas as pd
+
+from vasp_parser import VaspLastStepParser
+from force_analysis import Analyzer
+from decision_module import RelaxationDecision
+
+COLUMNS = ['run', 'steps', 'max_force', 'pressure', 'energy', 'finished', 'converged', 'suggested_isif', 'error']
+
+RUN_FILES = ('vasprun.xml', 'vasprun.xml.gz', 'vasprun.xml.bz2', 'vasprun.xml.xz')
+
+def find_runs(roots, filenames=RUN_FILES):
+    """
+    One file per run directory below the given directories: the first of `filenames` present
+    (plain vasprun.xml before compressed copies). Files given directly are kept. Sorted.
+    """
+    runs = []
+    for root in roots:
+        if os.path.isfile(root):
+            runs.append(root)
+            continue
+        for dirpath, dirnames, files in os.walk(root):
+            dirnames.sort()
+            present = set(files)
+            found = next((name for name in filenames if name in present), None)
+            if found:
+                runs.append(os.path.join(dirpath, found))
+    return sorted(runs)
+
+def evaluate_run(filepath, force_thresh=0.02, pressure_thresh=5.0):
+    """
+    Worker: convergence summary of one run as a flat dict (see COLUMNS).
+    Only the final ionic step is decoded; the step count comes from a byte scan.
+    Failures are reported in the 'error' entry instead of raising.
+    """
+    row = dict.fromkeys(COLUMNS)
+    row['run'] = filepath
+    try:
+        vp = VaspLastStepParser(filepath)
+        traj = vp.extract_trajectory()
+        # The final step carries its index from the same byte scan that located it
+        row['steps'] = int(traj.steps[-1]) + 1 if traj.n_steps else vp.count_steps()
+        row['finished'] = vp.finished
+        if traj.n_steps == 0:
+            row['error'] = "No complete ionic step"
+            return row
+
+        analyzer = Analyzer(traj)
+        last = analyzer.last_step()
+        decider = RelaxationDecision(analyzer, force_thresh=force_thresh, pressure_thresh=pressure_thresh, verbose=False)
+        exit_code, suggested_isif = decider.evaluate()
+        row.update({
+            'max_force': float(last['max_force']),
+            'pressure': None if last['pressure'] is None else float(last['pressure']),
+            'energy': float(traj.energy[-1]),
+            'converged': exit_code == 0,
+            'suggested_isif': suggested_isif
+            })
+    except Exception as e:
+        row['error'] = str(e)
+    return row
+
+def scan(roots, jobs=1, force_thresh=0.02, pressure_thresh=5.0):
+    """Evaluates every run below roots independently (in worker processes with jobs > 1); one row per run."""
+    runs = find_runs(roots)
+    if jobs < 0:
+        jobs = os.cpu_count()
+    if jobs <= 1 or len(runs) <= 1:
+        rows = [evaluate_run(f, force_thresh, pressure_thresh) for f in runs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            n = len(runs)
+            rows = list(pool.map(evaluate_run, runs, [force_thresh] * n, [pressure_thresh] * n,
+                                 chunksize=max(1, n // (4 * jobs))))
+
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    table['suggested_isif'] = table['suggested_isif'].astype('Int64')
+    return table
+
+def write_table(table, path):
+    """Writes the scan table as JSON (for .json paths) or CSV."""
+    if path.endswith('.json'):
+        table.to_json(path, orient='records', indent=2)
+    else:
+        table.to_csv(path, index=False)
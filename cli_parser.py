@@ -1,5 +1,9 @@
 import argparse
 
+def _depth(value):
+    """max_depth value: a positive integer or 'none' (unlimited)."""
+    return None if value.lower() == 'none' else int(value)
+
 class CLIParser:
     """Command-line interface parser for VASP AI Toolkit."""
     def __init__(self):
@@ -7,14 +11,43 @@ class CLIParser:
         self._add_arguments()
 
     def _add_arguments(self):
+        # Option names: the original options keep their underscore spelling (--f_tol, --n_estimators,
+        # --learning_rate, --noise_level, ...); options added since are dashed with an underscore
+        # dest= (--no-cache, --cache-dir, --watch-interval, ...). New options follow the dashed form.
+
         # Input/Output
-        self.parser.add_argument('files', nargs='+', help='Input vasprun.xml files')
+        self.parser.add_argument('files', nargs='+', help='Input vasprun.xml or OUTCAR files, optionally .gz/.bz2/.xz compressed, detected automatically (directories with --scan)')
+        self.parser.add_argument('--stream', action='store_true', help='Stream-parse XML in bounded memory (for large MD runs)')
+        self.parser.add_argument('--jobs', type=int, default=1, help='Worker processes for parsing, and cores for ML training/prediction (-1: all cores)')
+
+        # Profiling
+        self.parser.add_argument('--profile', nargs='?', const='profile.json', default=None,
+                                 help='Write a per-stage timing/memory report (JSON) to this path (default: profile.json)')
+        self.parser.add_argument('--profile-stage', dest='profile_stage', default=None,
+                                 help='Run cProfile on one stage (e.g. parse, train, generate, VaspParser.extract_arrays)')
+
+        # Parse Cache
+        self.parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Do not read or write the parsed-trajectory cache')
+        self.parser.add_argument('--cache-dir', dest='cache_dir', default=None, help='Cache directory (default: ~/.cache/vasp_forces_analysis)')
+        self.parser.add_argument('--cache-max-mb', dest='cache_max_mb', type=float, default=2048, help='Cache size limit in MB (least recently used entries are evicted)')
+        self.parser.add_argument('--cache-hash', dest='cache_hash', action='store_true', help='Include a content hash in the cache key (slower, robust to mtime-preserving copies)')
 
         # Functional Flags
         self.parser.add_argument('--plot', action='store_true', help='Enable visualization')
+        self.parser.add_argument('--plot-dir', dest='plot_dir', default=None, help='Write figures to this directory (headless) instead of showing them')
+        self.parser.add_argument('--plot-format', dest='plot_format', choices=['png', 'svg', 'pdf'], default='png', help='Figure file format for --plot-dir')
+        self.parser.add_argument('--online-stats', dest='online_stats', action='store_true',
+                                 help='Statistics from streaming accumulators (approximate quartiles); without --ml/--generate/--plot/--decision '
+                                      'the files are read --chunk-steps steps at a time and never held in memory')
         self.parser.add_argument('--ml', action='store_true', help='Enable ML training')
         self.parser.add_argument('--generate', type=int, default=0, help='Generate N zero-force structures (requires --ml)')
         self.parser.add_argument('--decision', action='store_true', help='Run convergence decision logic')
+        self.parser.add_argument('--watch', action='store_true', help='Follow running jobs: parse only appended steps and re-check convergence')
+        self.parser.add_argument('--scan', action='store_true',
+                                 help='Campaign mode: inputs are directory trees; every vasprun.xml is evaluated as a separate run')
+        self.parser.add_argument('--scan-output', dest='scan_output', default='campaign.csv',
+                                 help='Table written by --scan (.csv or .json)')
+        self.parser.add_argument('--watch-interval', dest='watch_interval', type=float, default=30.0, help='Polling interval in seconds for --watch')
 
         # Decision Thresholds
         self.parser.add_argument('--f_tol', type=float, default=0.02, help='Force tolerance (eV/A)')
@@ -24,13 +57,55 @@ class CLIParser:
         self.parser.add_argument('--n_estimators', type=int, default=100, help='Number of trees in Random Forest')
         self.parser.add_argument('--max_depth', type=int, default=None, help='Max depth of trees (default: None)')
         self.parser.add_argument('--min_samples_split', type=int, default=2, help='Min samples required to split a node')
+        self.parser.add_argument('--features', choices=['xyz', 'local'], default='xyz',
+                                 help='Model inputs: raw coordinates or periodic local-environment descriptors')
+        self.parser.add_argument('--cutoff', type=float, default=5.0, help='Neighbor cutoff radius (A) for --features local')
+        self.parser.add_argument('--sample-rows', dest='sample_rows', type=int, default=None,
+                                 help='Out-of-core training: stream the files in chunks and fit on a stratified sample of at most N atom rows')
+        self.parser.add_argument('--chunk-steps', dest='chunk_steps', type=int, default=256, help='Ionic steps per chunk for --sample-rows and --online-stats')
+        self.parser.add_argument('--search', action='store_true',
+                                 help='Cross-validated hyperparameter search before training; the best configuration trains the final model '
+                                      '(requires --ml or --generate; not with --load-model or --sample-rows)')
+        self.parser.add_argument('--search-n-estimators', dest='search_n_estimators', type=int, nargs='+', default=[50, 100, 200],
+                                 help='n_estimators values for --search')
+        self.parser.add_argument('--search-max-depth', dest='search_max_depth', type=_depth, nargs='+', default=[None, 10, 20],
+                                 help="max_depth values for --search ('none': unlimited)")
+        self.parser.add_argument('--search-min-samples-split', dest='search_min_samples_split', type=int, nargs='+', default=[2, 5, 10],
+                                 help='min_samples_split values for --search')
+        self.parser.add_argument('--cv-folds', dest='cv_folds', type=int, default=5, help='Cross-validation folds for --search')
+        self.parser.add_argument('--cv-group', dest='cv_group', choices=['step', 'file'], default='step',
+                                 help='Keep whole ionic steps or whole files on one side of each fold')
+        self.parser.add_argument('--search-margin', dest='search_margin', type=float, default=0.05,
+                                 help='Stop a configuration once its mean R2 is this far below the best')
+        self.parser.add_argument('--search-output', dest='search_output', default=None, help='Write the ranked --search table (.csv or .json)')
+        self.parser.add_argument('--save-model', dest='save_model', default=None, help='Write the trained model to this file')
+        self.parser.add_argument('--load-model', dest='load_model', default=None, help='Use a previously saved model instead of training')
 
         # Structure Generation Tuning
-        self.parser.add_argument('--learning_rate', type=float, default=0.1, help='Step size for structure relaxation')
+        self.parser.add_argument('--learning_rate', type=float, default=0.1, help='Step size for steepest descent (initial time step for FIRE)')
         self.parser.add_argument('--steps', type=int, default=50, help='Max iterations for relaxation')
+        self.parser.add_argument('--optimizer', choices=['sd', 'fire', 'lbfgs'], default='sd',
+                                 help='Relaxation algorithm: fixed-step steepest descent, FIRE or L-BFGS')
+        self.parser.add_argument('--fmax', type=float, default=0.05, help='Per-structure convergence: max predicted atomic force (eV/A)')
+        self.parser.add_argument('--max-step', dest='max_step', type=float, default=0.2, help='Step-length limit (A) for FIRE/L-BFGS')
+        self.parser.add_argument('--compiled-rows', dest='compiled_rows', type=int, default=512,
+                                 help='Predict batches of up to N atom rows with the compiled forest during generation (0: always use the sklearn pipeline)')
+        self.parser.add_argument('--gen-format', dest='gen_format', choices=['poscar', 'xdatcar', 'tar'], default='poscar',
+                                 help='Generated structures as separate POSCARs, one multi-frame XDATCAR, or one tar.gz of POSCARs')
+        self.parser.add_argument('--gen-output', dest='gen_output', default=None,
+                                 help='Output directory (poscar) or file (xdatcar/tar) for generated structures')
         self.parser.add_argument('--noise_level', type=float, default=None, 
                                  help='Perturbation noise level (default: 0.02 for Direct, 0.2 for Cartesian)')
 
     def parse(self):
-        return self.parser.parse_args()
+        args = self.parser.parse_args()
+        if args.search:
+            # The search runs only where the full training set is fitted
+            if not (args.ml or args.generate > 0):
+                self.parser.error('--search requires --ml or --generate')
+            if args.load_model:
+                self.parser.error('--search trains the model and cannot be combined with --load-model')
+            if args.sample_rows:
+                self.parser.error('--search is not supported with --sample-rows')
+        return args
 
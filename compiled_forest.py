@@ -0,0 +1,125 @@
+import numpy as np
+
+TREE_LEAF = -1
+
+def design_matrix(features, codes, n_categories):
+    """
+    float32 model input as the fitted pipeline sees it: one-hot block (column = element code,
+    -1 for unknown elements: all zeros) followed by the feature columns, as the ColumnTransformer.
+    """
+    Z = np.zeros((len(features), n_categories + features.shape[1]), dtype=np.float32)
+    known = codes >= 0
+    Z[np.flatnonzero(known), codes[known]] = 1.0
+    Z[:, n_categories:] = features
+    return Z
+
+class CompiledForest:
+    """
+    Prediction-only copy of a fitted MLModel pipeline (OneHotEncoder on 'element' + passthrough
+    features + RandomForestRegressor) that skips the pandas/ColumnTransformer layer.
+    The nodes of all trees are concatenated into flat arrays and every (tree, row) pair descends
+    one level per NumPy operation, so a call costs a few array operations per tree level instead
+    of the per-call and per-tree overhead of the pipeline. Inputs are compared in float32 and the
+    trees are summed in estimator order, as sklearn does, so predictions match the pipeline bit
+    for bit (with a single-job forest; several jobs add the trees in completion order).
+    """
+    # Levels descended between removals of finished (tree, row) pairs
+    COMPACT_EVERY = 8
+
+    def __init__(self, elements, feature_columns, roots, feature, threshold, right, value):
+        """
+        elements: One-hot categories in encoder order
+        feature_columns: Passthrough columns in input order
+        roots: Index of each tree's root node in the flat node arrays
+        feature/threshold/right/value: Concatenated node arrays of all trees. The left child of
+            node i is i + 1 (depth-first order); leaves have threshold -inf and right = themselves
+        """
+        self.elements = list(elements)
+        self.element_index = {e: i for i, e in enumerate(self.elements)}
+        self.feature_columns = list(feature_columns)
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+
+    @classmethod
+    def from_pipeline(cls, pipeline, feature_columns):
+        """Exports a fitted MLModel pipeline; raises ValueError for an unexpected layout."""
+        preprocessor = pipeline.named_steps['preprocessor']
+        forest = pipeline.named_steps['regressor']
+        encoder = preprocessor.named_transformers_['cat']
+        passthrough = [c for c in preprocessor.feature_names_in_ if c != 'element']
+        if passthrough != list(feature_columns):
+            raise ValueError(f"Pipeline columns {passthrough} do not match the model features {list(feature_columns)}")
+
+        roots, feature, threshold, right, value = [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == TREE_LEAF
+            if np.any(tree.children_left[~leaf] != nodes[~leaf] + 1):
+                raise ValueError("Tree nodes are not in depth-first order")
+
+            # Largest float32 <= each threshold: for float32 inputs x <= t32 exactly when x <= t
+            t32 = tree.threshold.astype(np.float32)
+            above = t32.astype(float) > tree.threshold
+            t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+            # Leaves: x <= -inf never holds, so a finished pair keeps stepping "right" onto itself
+            t32[leaf] = -np.inf
+
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(t32)
+            right.append(np.where(leaf, nodes, tree.children_right) + offset)
+            value.append(tree.value[:, :, 0])
+            offset += tree.node_count
+
+        return cls(encoder.categories_[0], feature_columns, np.array(roots, dtype=np.intp),
+                   np.concatenate(feature).astype(np.intp), np.concatenate(threshold),
+                   np.concatenate(right).astype(np.intp), np.concatenate(value))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def encode(self, elements):
+        """One-hot column of each element symbol (-1 for elements unseen in training)."""
+        return np.array([self.element_index.get(e, -1) for e in elements], dtype=np.intp)
+
+    def _leaves(self, Z):
+        """Leaf node of every (row, tree) pair, shape (n_rows, n_trees)."""
+        n_rows, n_cols = Z.shape
+        flat = Z.ravel()
+        # Tree-major order: neighbouring pairs walk the same tree, which keeps its nodes in cache
+        node = np.repeat(self.roots, n_rows)
+        offset = np.tile(np.arange(n_rows) * n_cols, self.n_trees)
+        pair = np.arange(len(node))
+        leaves = np.empty(len(node), dtype=np.intp)
+        while len(node):
+            for _ in range(self.COMPACT_EVERY):
+                go_left = flat[offset + self.feature[node]] <= self.threshold[node]
+                node = np.where(go_left, node + 1, self.right[node])
+            leaves[pair] = node
+            live = self.threshold[node] != -np.inf
+            node, offset, pair = node[live], offset[live], pair[live]
+        return leaves.reshape(self.n_trees, n_rows).T
+
+    def predict(self, features, elements):
+        """
+        features: (n_rows, n_features) array in feature_columns order
+        elements: Element symbol per row, or codes from encode()
+        Returns the predicted forces, (n_rows, n_outputs).
+        """
+        codes = np.asarray(elements)
+        if codes.dtype.kind not in 'iu':
+            codes = self.encode(elements)
+        features = np.asarray(features, dtype=float).reshape(len(codes), -1)
+        leaves = self._leaves(design_matrix(features, codes, len(self.elements)))
+
+        out = np.zeros((len(features), self.value.shape[1]))
+        for t in range(self.n_trees):
+            out += self.value[leaves[:, t]]
+        out /= self.n_trees
+        return out
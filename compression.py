@@ -0,0 +1,90 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+COMPRESSED = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+# Decompressed bytes per read. Large reads keep the per-call overhead of the decompressors
+# negligible; four chunks in flight let decompression run ahead of the parser.
+CHUNK_SIZE = 1 << 20
+PREFETCH_CHUNKS = 4
+
+def is_compressed(filepath):
+    return os.path.splitext(filepath)[1].lower() in COMPRESSED
+
+def strip_compression(filepath):
+    """Path without a .gz/.bz2/.xz suffix (used for name-based format detection)."""
+    return os.path.splitext(filepath)[0] if is_compressed(filepath) else filepath
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Read-only stream that decompresses in a background thread. zlib, bz2 and lzma release the
+    GIL while decompressing, so decompression overlaps with XML parsing in the reading thread.
+    """
+    def __init__(self, source, chunk_size=CHUNK_SIZE, depth=PREFETCH_CHUNKS):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+        self.current = memoryview(b'')
+        self.eof = False
+        self.thread = threading.Thread(target=self._fill, daemon=True)
+        self.thread.start()
+
+    def _fill(self):
+        try:
+            while not self.stopped.is_set():
+                chunk = self.source.read(self.chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as e: # Re-raised in the reading thread
+            self._put(e)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.current and not self.eof:
+            item = self.chunks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self.eof = True
+            self.current = memoryview(item)
+        n = min(len(buffer), len(self.current))
+        buffer[:n] = self.current[:n]
+        self.current = self.current[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.source.close()
+        super().close()
+
+def open_input(filepath, prefetch=True):
+    """
+    Binary, read-only stream of filepath; .gz/.bz2/.xz files are decompressed on the fly.
+    prefetch: Decompress in a background thread (see PrefetchReader)
+    """
+    module = COMPRESSED.get(os.path.splitext(filepath)[1].lower())
+    if module is None:
+        return open(filepath, 'rb')
+    source = module.open(filepath, 'rb')
+    if prefetch:
+        return io.BufferedReader(PrefetchReader(source), CHUNK_SIZE)
+    return io.BufferedReader(source, CHUNK_SIZE)
@@ -0,0 +1,56 @@
+"""
+Minimal convergence-decision entry point for job scripts:
+
+    python decide.py vasprun.xml [--f_tol 0.02] [--p_tol 5.0]
+
+Only the parser, Analyzer and RelaxationDecision are imported, keeping cold start small.
+Exit codes match `--decision` of the full toolkit: 0 when converged, otherwise the suggested ISIF.
+"""
+import argparse
+import sys
+
+from vasp_parser import parse_file
+from parse_cache import ParseCache
+from trajectory import Trajectory
+from force_analysis import Analyzer
+from decision_module import RelaxationDecision
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VASP AI Toolkit: convergence decision")
+    parser.add_argument('files', nargs='+', help='Input vasprun.xml files')
+    parser.add_argument('--f_tol', type=float, default=0.02, help='Force tolerance (eV/A)')
+    parser.add_argument('--p_tol', type=float, default=5.0, help='Pressure tolerance (kB)')
+    parser.add_argument('--stream', action='store_true', help='Stream-parse XML in bounded memory (for large MD runs)')
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Do not read or write the parsed-trajectory cache')
+    parser.add_argument('--cache-dir', dest='cache_dir', default=None, help='Cache directory (default: ~/.cache/vasp_forces_analysis)')
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else ParseCache(args.cache_dir)
+
+    # A single run only needs its final ionic step; several runs are compared by step index
+    last_step_only = len(args.files) == 1
+
+    trajectories = []
+    for f in args.files:
+        try:
+            traj = Trajectory.from_parsed(parse_file(f, stream=args.stream, cache=cache, last_step_only=last_step_only))
+            if traj.n_steps > 0:
+                trajectories.append(traj)
+        except Exception as e:
+            print(f"Error reading {f}: {e}")
+
+    if not trajectories:
+        print("No valid data found.")
+        sys.exit(1)
+
+    decider = RelaxationDecision(Analyzer(trajectories), force_thresh=args.f_tol, pressure_thresh=args.p_tol)
+    exit_code, suggested_isif = decider.evaluate()
+
+    if exit_code == 0:
+        print("Structure Converged. Exiting 0.")
+        sys.exit(0)
+    print(f"Structure NOT Converged. Next ISIF: {suggested_isif}")
+    sys.exit(suggested_isif)
+
+if __name__ == "__main__":
+    main()
@@ -6,40 +6,43 @@ class RelaxationDecision:
     This class evaluates the convergence of a relaxation step and suggests the next ISIF setting.
     It uses the force and pressure data from the Analyzer to make informed decisions.
     """
-    def __init__(self, analyzer, force_thresh=0.02, pressure_thresh=5.0):
+    def __init__(self, analyzer, force_thresh=0.02, pressure_thresh=5.0, verbose=True):
         """
         analyzer: Instance of force_analysis.Analyzer
         force_thresh: Max force convergence criterion (eV/A)
         pressure_thresh: Max pressure convergence criterion (kB)
+        verbose: Print the check and the suggestion
         """
         self.ana = analyzer
         self.f_thresh = force_thresh
         self.p_thresh = pressure_thresh
+        self.verbose = verbose
 
     def evaluate(self):
         """
         Evaluates convergence and returns a status code and suggested ISIF.
         """
         # Get last step data
-        last_step_idx = self.ana.df['step'].max()
-        last_step_df = self.ana.df[self.ana.df['step'] == last_step_idx]
+        last_step = self.ana.last_step()
 
         # Force Check
-        max_force = last_step_df['magnitude'].max()
+        max_force = last_step['max_force']
         forces_converged = max_force < self.f_thresh
 
         # Pressure/Stress Check
         pressure_converged = True
         current_pressure = 0.0
 
-        if 'pressure' in last_step_df.columns:
-            current_pressure = abs(last_step_df['pressure'].iloc[0])
+        if last_step['pressure'] is not None:
+            current_pressure = abs(last_step['pressure'])
             pressure_converged = current_pressure < self.p_thresh
 
-        print(f"Decision Check -> Max Force: {max_force:.4f}/{self.f_thresh}, Pressure: {current_pressure:.2f}/{self.p_thresh}")
+        if self.verbose:
+            print(f"Decision Check -> Max Force: {max_force:.4f}/{self.f_thresh}, Pressure: {current_pressure:.2f}/{self.p_thresh}")
 
         if forces_converged and pressure_converged:
-            print("CONVERGED: Structure is relaxed.")
+            if self.verbose:
+                print("CONVERGED: Structure is relaxed.")
             return 0, None # Exit code 0, No ISIF needed
 
         # Logic for next step if not converged
@@ -59,6 +62,7 @@ class RelaxationDecision:
             # Just modify all
             suggested_isif = 3
 
-        print(f"NOT CONVERGED. Suggested next run: ISIF = {suggested_isif}")
+        if self.verbose:
+            print(f"NOT CONVERGED. Suggested next run: ISIF = {suggested_isif}")
         return 1, suggested_isif
 
@@ -1,28 +1,110 @@
 import numpy as np
-import scipy.stats as stats
 import pandas as pd
 
+from trajectory import Trajectory
+from online_stats import TrajectoryStats
+
 class Analyzer:
-    def __init__(self, dataframe):
-        self.df = dataframe
-        # Calculate Magnitude of Forces
-        self.df['magnitude'] = np.linalg.norm(self.df[['fx', 'fy', 'fz']].values, axis=1)
+    def __init__(self, trajectories, online=False):
+        """
+        trajectories: Trajectory or list of Trajectory (one per input file)
+        online: Compute the *_stats tables from streaming accumulators (see online_stats) that are
+                updated per appended trajectory, instead of describe() over the full columns
+        """
+        if isinstance(trajectories, Trajectory):
+            trajectories = [trajectories]
+        self.trajectories = list(trajectories)
+        # Per-(file, step) summary pieces shared by all statistics, the decision module and the
+        # visualizer; appends add a piece, the table is concatenated when read (see summary)
+        self._summary_parts = []
+        self._has_stress = False
+        self._last = None
+        for traj in self.trajectories:
+            self._add_summary(traj.step_summary())
+        self.online_stats = None
+        if online:
+            self.online_stats = TrajectoryStats()
+            for traj in self.trajectories:
+                self.online_stats.update(traj)
+
+    @property
+    def df(self):
+        """Long-format per-atom DataFrame with a 'magnitude' column (built on demand, for compatibility)."""
+        frames = []
+        for traj in self.trajectories:
+            df = traj.to_dataframe().copy()
+            df['magnitude'] = traj.magnitude.ravel()
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    @property
+    def summary(self):
+        """Per-(file, step) summary table; pieces appended since the last read are concatenated once."""
+        if len(self._summary_parts) != 1:
+            self._summary_parts = [pd.concat(self._summary_parts, ignore_index=True)]
+        return self._summary_parts[0]
+
+    @property
+    def has_stress(self):
+        return self._has_stress
+
+    def _add_summary(self, part):
+        """Adds a summary piece and updates the running last-step record (see last_step) from it alone."""
+        self._summary_parts.append(part)
+        self._has_stress = self._has_stress or 'pressure' in part.columns
+        if len(part) == 0:
+            return
+        step = part['step'].max()
+        rows = part[part['step'] == step]
+        max_force = rows['max_force'].max()
+        # The pressure of the last step is taken from its first row in table order
+        pressure = rows['pressure'].iloc[0] if 'pressure' in rows.columns else np.nan
+        if self._last is None or step > self._last['step']:
+            self._last = {"step": step, "max_force": max_force, "pressure": pressure}
+        elif step == self._last['step']:
+            self._last['max_force'] = max(self._last['max_force'], max_force)
+
+    def append(self, trajectory):
+        """
+        Adds newly parsed steps; extends the trajectory of the same file if already known.
+        Only the new steps are summarized and appended to the summary table.
+        """
+        for traj in self.trajectories:
+            if traj.file_source == trajectory.file_source:
+                traj.extend(trajectory)
+                break
+        else:
+            self.trajectories.append(trajectory)
+        self._add_summary(trajectory.step_summary())
+        if self.online_stats is not None:
+            self.online_stats.update(trajectory)
 
     def force_stats(self):
-        return self.df['magnitude'].describe()
+        if self.online_stats is not None:
+            return self.online_stats.force_stats()
+        magnitudes = np.concatenate([t.magnitude.ravel() for t in self.trajectories])
+        return pd.Series(magnitudes, name='magnitude').describe()
 
     def pressure_stats(self):
-        if 'pressure' in self.df.columns:
-            # Pressure is one value per step, so we drop duplicates to analyze trajectory
-            step_data = self.df.drop_duplicates(subset=['step', 'file_source'])
-            return step_data['pressure'].describe()
+        if self.online_stats is not None:
+            return self.online_stats.pressure_stats()
+        if self.has_stress:
+            # Pressure is one value per step, so the summary table holds it once per step
+            return self.summary['pressure'].describe()
         return "No Pressure data found."
 
+    def last_step(self):
+        """
+        Summary of the final ionic step (highest step index over all files):
+        step index, max force over all atoms at that step and pressure (None without stress data).
+        Kept up to date by append(), so the watch loop does not rescan the summary table.
+        """
+        pressure = self._last['pressure'] if self.has_stress else None
+        return {"step": self._last['step'], "max_force": self._last['max_force'], "pressure": pressure}
+
     def check_convergence(self, force_thresh=0.01):
         """Checks if the maximum force at the last step is below a specified threshold."""
-        last_step = self.df['step'].max()
-        final_forces = self.df[self.df['step'] == last_step]['magnitude']
-        max_force = final_forces.max()
+        max_force = self.last_step()["max_force"]
         return {
                 "converged": max_force < force_thresh,
                 "max_force": max_force
@@ -30,24 +112,20 @@ class Analyzer:
 
     def energy_stats(self):
         """Energy is also one value per step, so we analyze it similarly to pressure."""
-        if 'energy' in self.df.columns:
-            # Drop duplicates because energy is constant per step (same for all atoms in that step)
-            step_data = self.df.drop_duplicates(subset=['step', 'file_source'])
-            return step_data['energy'].describe()
-        return "No Energy data found."
+        if self.online_stats is not None:
+            return self.online_stats.energy_stats()
+        return self.summary['energy'].describe()
 
     def drift_stats(self):
         """Calculates Total Drift (Sum of forces on all atoms) per step."""
-        # Sum forces for each step
-        drift_df = self.df.groupby(['step', 'file_source'])[['fx', 'fy', 'fz']].sum()
-        # Calculate magnitude of the drift vector
-        drift_mags = np.linalg.norm(drift_df.values, axis=1)
-        return pd.Series(drift_mags, name="Drift Magnitude").describe()
+        if self.online_stats is not None:
+            return self.online_stats.drift_stats()
+        return self.summary['drift'].rename("Drift Magnitude").describe()
 
     def stress_stats(self):
         """Extended stress statistics."""
-        if 'stress_xx' in self.df.columns:
-            step_data = self.df.drop_duplicates(subset=['step', 'file_source'])
-            return step_data[['stress_xx', 'stress_yy', 'stress_zz']].describe()
+        if self.online_stats is not None:
+            return self.online_stats.stress_stats()
+        if self.has_stress:
+            return self.summary[['stress_xx', 'stress_yy', 'stress_zz']].describe()
         return "No Stress data found."
-
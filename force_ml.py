@@ -1,53 +1,339 @@
+import hashlib
+import json
+import os
+import joblib
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import GroupShuffleSplit, train_test_split
+
+from profiling import profiler
+from trajectory import Trajectory
+from neighbor_list import LocalDescriptors
+from optimizers import OPTIMIZERS
+from compiled_forest import CompiledForest
+from sampling import StratifiedReservoir
 
 class MLModel:
-    def __init__(self, data, n_estimators=100, max_depth=None, min_samples_split=2):
-        self.data = data
+    def __init__(self, trajectories, n_estimators=100, max_depth=None, min_samples_split=2, features="xyz", cutoff=5.0, n_jobs=1, species=None):
+        """
+        trajectories: Trajectory or list of Trajectory used as training data (may be empty for train_sampled)
+        features: "xyz" (raw coordinates) or "local" (periodic neighbor-list descriptors, see neighbor_list.py)
+        cutoff: Neighbor cutoff radius in Angstrom for "local" features
+        n_jobs: Cores used by the forest for training and prediction (-1: all)
+        species: Element symbols in the data (default: the elements of trajectories); they define the
+                 "local" radial channels and the sampling strata of train_sampled
+        """
+        if isinstance(trajectories, Trajectory):
+            trajectories = [trajectories]
+        self.trajectories = list(trajectories)
         self.n_estimators = n_estimators
         self.max_depth = max_depth
         self.min_samples_split = min_samples_split
+        self.features = features
+        self.cutoff = cutoff
+        self.n_jobs = n_jobs
+        self.descriptors = None
         self.model = None
+        self.compiled = None
+        self.compiled_max_rows = 0
+        self.meta = None
         self.is_trained = False
 
-    def train(self):
-        X = self.data[['x', 'y', 'z', 'element']]
-        y = self.data[['fx', 'fy', 'fz']]
+        if species is None:
+            species = []
+            for t in self.trajectories:
+                for s in t.symbols:
+                    if s not in species:
+                        species.append(s)
+        self.species = list(species)
+
+        if self.features == "local":
+            self.descriptors = LocalDescriptors(self.species, cutoff=cutoff)
+        elif self.features != "xyz":
+            raise ValueError(f"Unknown feature set: {features}")
+
+    def fingerprint(self):
+        """Hash of the hyperparameters and the training data; identical inputs give identical models."""
+        h = hashlib.sha1(json.dumps(self.hyperparameters(), sort_keys=True).encode())
+        for t in self.trajectories:
+            h.update(" ".join(t.symbols).encode())
+            h.update(t.coordinate_type.encode())
+            h.update(np.ascontiguousarray(t.positions).tobytes())
+            h.update(np.ascontiguousarray(t.forces).tobytes())
+            if self.descriptors is not None and t.lattice is not None:
+                h.update(np.ascontiguousarray(t.lattice).tobytes())
+        return h.hexdigest()[:16]
+
+    def hyperparameters(self):
+        return {
+                'n_estimators': self.n_estimators,
+                'max_depth': self.max_depth,
+                'min_samples_split': self.min_samples_split,
+                'features': self.features,
+                'cutoff': self.cutoff
+                }
+
+    def metadata(self):
+        """Description of the trained model stored alongside the pipeline."""
+        elements = sorted({s for t in self.trajectories for s in t.symbols})
+        coordinate_types = sorted({t.coordinate_type for t in self.trajectories})
+        return {
+                'elements': elements,
+                'coordinate_type': coordinate_types[0] if len(coordinate_types) == 1 else coordinate_types,
+                'hyperparameters': self.hyperparameters(),
+                'fingerprint': self.fingerprint()
+                }
+
+    def save(self, path):
+        """Serializes the fitted pipeline (and descriptor settings) with its metadata."""
+        if not self.is_trained:
+            raise Exception("Model not trained.")
+        self.meta = self.meta or self.metadata()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump({'pipeline': self.model, 'descriptors': self.descriptors, 'metadata': self.meta}, tmp)
+        os.replace(tmp, path)
+        print(f"Saved model to {path}")
+
+    def load(self, path):
+        """Restores a model written by save(); its hyperparameters replace the current ones."""
+        payload = joblib.load(path)
+        self.model = payload['pipeline']
+        self.compiled = None
+        self.descriptors = payload['descriptors']
+        self.meta = payload['metadata']
+        hyper = self.meta['hyperparameters']
+        self.n_estimators = hyper['n_estimators']
+        self.max_depth = hyper['max_depth']
+        self.min_samples_split = hyper['min_samples_split']
+        self.features = hyper['features']
+        self.cutoff = hyper['cutoff']
+        self.model.set_params(regressor__n_jobs=self.n_jobs)
+        self.is_trained = True
+        print(f"Loaded model from {path} (Elements: {', '.join(self.meta['elements'])}, Coords: {self.meta['coordinate_type']})")
+
+    @property
+    def feature_columns(self):
+        if self.descriptors is not None:
+            return self.descriptors.feature_names
+        return ['x', 'y', 'z']
+
+    def _feature_values(self, frames, elements, lattice=None, coordinate_system="Direct"):
+        """Feature columns for a stack of frames (n_frames, n_atoms, 3) as an (n_frames * n_atoms, n_features) array."""
+        frames = np.asarray(frames, dtype=float)
+        if self.descriptors is not None:
+            if lattice is None:
+                raise ValueError("Local-environment features need the lattice.")
+            values = self.descriptors.compute_frames(lattice, frames, elements, coordinate_system)
+            return values.reshape(-1, self.descriptors.n_features)
+        return frames.reshape(-1, 3)
+
+    def _feature_frame(self, frames, elements, lattice=None, coordinate_system="Direct"):
+        """Model input for a stack of frames (n_frames, n_atoms, 3): one row per atom and frame."""
+        frames = np.asarray(frames, dtype=float)
+        values = self._feature_values(frames, elements, lattice, coordinate_system)
+        df = pd.DataFrame(values, columns=self.feature_columns)
+        df['element'] = np.tile(np.asarray(elements, dtype=object), len(frames))
+        return df
+
+    def _training_frame(self):
+        """Flattens the trajectories into one row per atom and step (only the columns the model uses)."""
+        X = pd.concat([
+            self._feature_frame(t.positions, t.symbols, t.lattice, t.coordinate_type)
+            for t in self.trajectories
+            ], ignore_index=True)
+        y = pd.DataFrame(
+                np.concatenate([t.forces.reshape(-1, 3) for t in self.trajectories]),
+                columns=['fx', 'fy', 'fz']
+                )
+        return X, y
+
+    def _training_groups(self):
+        """(file index, step) of every row of _training_frame, for splits that keep ionic steps together."""
+        return np.concatenate([
+            np.column_stack([np.full(t.n_steps * t.n_atoms, i), np.repeat(t.steps, t.n_atoms)])
+            for i, t in enumerate(self.trajectories)
+            ])
+
+    def training_arrays(self):
+        """
+        Training data as arrays: (features (n, n_features), element per row, forces (n, 3),
+        groups (n, 2) of (file index, step)), in the row order of train().
+        """
+        features = np.concatenate([self._feature_values(t.positions, t.symbols, t.lattice, t.coordinate_type)
+                                   for t in self.trajectories])
+        elements = np.concatenate([np.tile(np.asarray(t.symbols, dtype=object), t.n_steps) for t in self.trajectories])
+        forces = np.concatenate([t.forces.reshape(-1, 3) for t in self.trajectories])
+        return features, elements, forces, self._training_groups()
+
+    def train(self, cache_dir=None):
+        """
+        Fits the model. With cache_dir, a model previously trained on identical data and
+        hyperparameters is loaded instead, and newly trained models are stored there
+        (ParseCache.model_dir, whose size limit ParseCache.evict enforces).
+        """
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, f"model_{self.fingerprint()}.joblib")
+            if os.path.exists(cache_path):
+                try:
+                    self.load(cache_path)
+                    os.utime(cache_path) # Mark as recently used for eviction
+                    return
+                except Exception as e:
+                    print(f"Ignoring unreadable cached model {cache_path}: {e}")
+
+        with profiler.stage('MLModel.train.features') as stage:
+            X, y = self._training_frame()
+            stage.rows = len(X)
+
+        self._fit(X, y, self._training_groups())
+        self.meta = self.metadata()
 
+        if cache_path is not None:
+            self.save(cache_path)
+
+    def train_sampled(self, chunks, max_rows=1_000_000, seed=None):
+        """
+        Out-of-core training: chunks is an iterable of Trajectory pieces (e.g. vasp_parser.iter_chunks
+        over many files). Each chunk is featurized and offered to a StratifiedReservoir, so memory
+        stays bounded by max_rows however many rows are streamed; the forest is fit on the sample.
+        """
+        reservoir = StratifiedReservoir(self.species, max_rows, len(self.feature_columns), seed)
+        coordinate_types = set()
+        with profiler.stage('MLModel.train_sampled.stream') as stage:
+            stage.rows = 0
+            for chunk in chunks:
+                if chunk.n_steps == 0:
+                    continue
+                X = self._feature_frame(chunk.positions, chunk.symbols, chunk.lattice, chunk.coordinate_type)
+                reservoir.add(X[self.feature_columns].to_numpy(), chunk.forces.reshape(-1, 3),
+                              X['element'].to_numpy(), np.repeat(chunk.steps, chunk.n_atoms), chunk.file_source)
+                coordinate_types.add(chunk.coordinate_type)
+                stage.rows += len(X)
+
+        if not reservoir.sources:
+            raise ValueError("No training data in chunks.")
+
+        composition = reservoir.composition()
+        print("Training-set composition:")
+        print(composition)
+        print(f"Sampled {composition['rows_sampled'].sum()} of {composition['rows_seen'].sum()} rows "
+              f"from {len(reservoir.sources)} file(s)")
+
+        values, forces, labels, groups = reservoir.sample()
+        X = pd.DataFrame(values, columns=self.feature_columns)
+        X['element'] = labels
+        y = pd.DataFrame(forces, columns=['fx', 'fy', 'fz'])
+        self._fit(X, y, groups)
+
+        coordinate_types = sorted(coordinate_types)
+        self.meta = {
+                'elements': sorted(composition.index[composition['rows_seen'] > 0]),
+                'coordinate_type': coordinate_types[0] if len(coordinate_types) == 1 else coordinate_types,
+                'hyperparameters': self.hyperparameters(),
+                'fingerprint': None,
+                'training_set': composition.reset_index().to_dict(orient='records')
+                }
+
+    def _fit(self, X, y, groups=None):
+        """
+        Builds the pipeline and fits it on X/y with an 80/20 hold-out for the R2 report.
+        groups: (file index, step) per row; whole ionic steps are held out, so atoms of one
+                step are never on both sides (random rows without groups or with a single step)
+        """
         preprocessor = ColumnTransformer(
                 transformers=[('cat', OneHotEncoder(handle_unknown='ignore'), ['element'])],
                 remainder='passthrough'
                 )
 
-        # n_jobs=1 prevents Tkinter/Multiprocessing conflict
         self.model = Pipeline(steps=[
             ('preprocessor', preprocessor),
             ('regressor', RandomForestRegressor(
                 n_estimators=self.n_estimators, 
                 max_depth=self.max_depth,
                 min_samples_split=self.min_samples_split,
-                n_jobs=1
+                n_jobs=self.n_jobs
                 ))
             ])
 
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
-        print(f"Training ML model (Trees: {self.n_estimators}, Depth: {self.max_depth})...")
-        self.model.fit(X_train, y_train)
+        self.compiled = None
+        labels = None if groups is None else np.unique(groups, axis=0, return_inverse=True)[1].ravel()
+        if labels is not None and labels.max() > 0:
+            train_idx, test_idx = next(GroupShuffleSplit(n_splits=1, test_size=0.2).split(X, y, labels))
+            X_train, X_test, y_train, y_test = X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+        else:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
+        print(f"Training ML model (Trees: {self.n_estimators}, Depth: {self.max_depth}, Jobs: {self.n_jobs})...")
+        with profiler.stage('MLModel.train.fit', rows=len(X_train)):
+            self.model.fit(X_train, y_train)
         self.is_trained = True
-        print(f"Model Accuracy (R2): {self.model.score(X_test, y_test):.4f}")
+        with profiler.stage('MLModel.train.score', rows=len(X_test)):
+            score = self.model.score(X_test, y_test)
+        print(f"Model Accuracy (R2): {score:.4f}")
 
-    def predict_forces(self, positions, elements):
+    def compile(self, positions=None, elements=None, lattice=None, coordinate_system="Direct", max_rows=512):
+        """
+        Exports the fitted pipeline to a CompiledForest, which predict_forces/predict_forces_batch
+        then use for calls of up to max_rows atom rows; larger batches amortize the pipeline overhead
+        and stay on sklearn's compiled tree traversal (see `benchmark.py predict` for the crossover).
+        With reference positions ((n_atoms, 3) or a stack), both predictors are run on them first;
+        on any difference the compiled one is discarded. Returns True if the compiled predictor is in use.
+        """
         if not self.is_trained:
             raise Exception("Model not trained.")
+        compiled = CompiledForest.from_pipeline(self.model, self.feature_columns)
+
+        if positions is not None:
+            frames = np.asarray(positions, dtype=float)
+            frames = frames[None] if frames.ndim == 2 else frames
+            expected = self.model.predict(self._feature_frame(frames, elements, lattice, coordinate_system))
+            values = self._feature_values(frames, elements, lattice, coordinate_system)
+            actual = compiled.predict(values, np.tile(compiled.encode(elements), len(frames)))
+            if not np.array_equal(expected, actual):
+                # Only the summation order of the trees may differ (a multi-threaded forest)
+                if not np.allclose(expected, actual, rtol=1e-12, atol=1e-12):
+                    print(f"Compiled predictor disagrees with the pipeline (max |diff| "
+                          f"{np.abs(expected - actual).max():.3e}); using the pipeline.")
+                    self.compiled = None
+                    return False
+                print("Compiled predictor matches the pipeline to rounding (trees summed in a different order).")
+            else:
+                print("Compiled predictor matches the pipeline exactly.")
 
-        df = pd.DataFrame(positions, columns=['x', 'y', 'z'])
-        df['element'] = elements
-        return self.model.predict(df)
+        self.compiled = compiled
+        self.compiled_max_rows = max_rows
+        return True
+
+    def _predict(self, frames, elements, lattice, coordinate_system):
+        """Forces for a stack of frames, one row per atom and frame, through the compiled forest if available."""
+        if self.compiled is not None and len(frames) * len(elements) <= self.compiled_max_rows:
+            values = self._feature_values(frames, elements, lattice, coordinate_system)
+            return self.compiled.predict(values, np.tile(self.compiled.encode(elements), len(frames)))
+        return self.model.predict(self._feature_frame(frames, elements, lattice, coordinate_system))
+
+    def predict_forces(self, positions, elements, lattice=None, coordinate_system="Direct"):
+        if not self.is_trained:
+            raise Exception("Model not trained.")
+
+        return self._predict(np.asarray(positions)[None], elements, lattice, coordinate_system)
+
+    def predict_forces_batch(self, positions, elements, lattice=None, coordinate_system="Direct"):
+        """
+        Predicts forces for a stack of structures sharing the same elements in one model call.
+        positions: (n_structures, n_atoms, 3); returns forces of the same shape.
+        """
+        if not self.is_trained:
+            raise Exception("Model not trained.")
+
+        positions = np.asarray(positions)
+        return self._predict(positions, elements, lattice, coordinate_system).reshape(positions.shape)
 
 class StructureGenerator:
     def __init__(self, ml_model, template_positions, template_elements, lattice):
@@ -56,12 +342,14 @@ class StructureGenerator:
         self.elements = template_elements
         self.lattice = lattice
 
-    def generate_zero_force_structures(self, n_structures, coordinate_system="Direct", steps=50, learning_rate=0.1, noise_level=None):
+    def generate_zero_force_structures(self, n_structures, coordinate_system="Direct", steps=50, learning_rate=0.1, noise_level=None,
+                                       optimizer="sd", fmax=0.05, max_step=0.2):
         """
         Generates relaxed structures.
+        optimizer: "sd" (fixed-step steepest descent), "fire" or "lbfgs" (see optimizers.py)
+        fmax: A structure is converged once its largest predicted atomic force is below this (eV/A)
+        max_step: Step-length limit of "fire"/"lbfgs" in Angstrom
         """
-        generated_structures = []
-
         # Determine noise level: Use User input if provided, else use Heuristic
         if noise_level is not None:
             current_noise = noise_level
@@ -69,24 +357,47 @@ class StructureGenerator:
             # Heuristic: Direct (0-1) needs small noise, Cartesian needs larger
             current_noise = 0.02 if coordinate_system == "Direct" else 0.2
 
-        print(f"Generating {n_structures} structures (Mode: {coordinate_system}, Noise: {current_noise}, LR: {learning_rate})...")
+        print(f"Generating {n_structures} structures (Mode: {coordinate_system}, Noise: {current_noise}, LR: {learning_rate}, Optimizer: {optimizer})...")
+
+        # 1. Perturb all structures at once
+        current_pos = self.positions + np.random.normal(0, current_noise, (n_structures,) + self.positions.shape)
 
-        for i in range(n_structures):
-            # 1. Perturb
-            current_pos = self.positions + np.random.normal(0, current_noise, self.positions.shape)
+        # 2. Relax, batched: one prediction per iteration for all active structures
+        opt = OPTIMIZERS[optimizer](n_structures, learning_rate=learning_rate, max_step=max_step)
+        # FIRE/L-BFGS take steps in Angstrom; fractional positions are converted around each step
+        to_cartesian = opt.cartesian and coordinate_system.lower().startswith('d') and self.lattice is not None
+        lattice = np.asarray(self.lattice, dtype=float) if to_cartesian else None
 
-            # 2. Relax (Steepest Descent)
-            for step in range(steps):
-                pred_forces = self.ml_model.predict_forces(current_pos, self.elements)
+        self.evaluations = np.zeros(n_structures, dtype=int)
+        self.converged = np.zeros(n_structures, dtype=bool)
+        active = np.arange(n_structures)
 
-                # Check convergence
-                max_f = np.max(np.linalg.norm(pred_forces, axis=1))
-                if max_f < 0.05: 
-                    break
+        for step in range(steps):
+            if len(active) == 0:
+                break
+            with profiler.stage('StructureGenerator.relax.predict', rows=len(active) * len(self.elements)):
+                pred_forces = self.ml_model.predict_forces_batch(
+                        current_pos[active], self.elements, lattice=self.lattice, coordinate_system=coordinate_system)
+            self.evaluations[active] += 1
 
-                current_pos += learning_rate * pred_forces
+            # Check convergence per structure; converged ones leave the active set
+            max_f = np.max(np.linalg.norm(pred_forces, axis=2), axis=1)
+            done = max_f < fmax
+            self.converged[active[done]] = True
 
-            generated_structures.append(current_pos)
+            keep = ~done
+            active = active[keep]
+            if len(active) == 0:
+                break
+            if to_cartesian:
+                cart = opt.step(active, current_pos[active] @ lattice, pred_forces[keep])
+                current_pos[active] = cart @ np.linalg.inv(lattice)
+            else:
+                current_pos[active] = opt.step(active, current_pos[active], pred_forces[keep])
 
-        return generated_structures
+        self.iterations = self.evaluations
+        print(f"Relaxation ({optimizer}): {self.converged.sum()}/{n_structures} converged (fmax {fmax}), "
+              f"model evaluations per structure min/mean/max = {self.evaluations.min()}/{self.evaluations.mean():.1f}/{self.evaluations.max()}, "
+              f"total {self.evaluations.sum()}")
 
+        return list(current_pos)
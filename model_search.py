@@ -0,0 +1,122 @@
+import itertools
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import GroupKFold
+
+from compiled_forest import design_matrix
+from profiling import profiler
+
+# Training data of the current search, set once per worker process (see _init_worker)
+_DATA = {}
+
+def grid(n_estimators=(50, 100, 200), max_depth=(None, 10, 20), min_samples_split=(2, 5, 10)):
+    """All combinations of the given hyperparameter values as MLModel.hyperparameters()-style dicts."""
+    return [{'n_estimators': n, 'max_depth': d, 'min_samples_split': m}
+            for n, d, m in itertools.product(n_estimators, max_depth, min_samples_split)]
+
+def _init_worker(X, y, folds):
+    _DATA.update(X=X, y=y, folds=folds)
+
+def _fit_fold(params, fold, seed):
+    """Worker: fits one configuration on the training part of one fold; returns (R2 on the held-out part, fit seconds)."""
+    X, y = _DATA['X'], _DATA['y']
+    train_idx, test_idx = _DATA['folds'][fold]
+    forest = RandomForestRegressor(**params, n_jobs=1, random_state=seed)
+    t0 = time.perf_counter()
+    forest.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - t0
+    return r2_score(y[test_idx], forest.predict(X[test_idx])), fit_s
+
+def search(ml, candidates, folds=5, jobs=1, group_by="step", margin=0.05, seed=0):
+    """
+    Grouped cross-validated search over hyperparameter candidates (dicts of n_estimators,
+    max_depth, min_samples_split) on the training data of an MLModel.
+    The data is featurized once and shipped once to each worker process; folds keep whole
+    ionic steps (group_by="step") or whole files (group_by="file") out of training.
+    Folds are evaluated in rounds, all remaining candidates in parallel; after each round a
+    candidate whose mean R2 is more than `margin` below the best mean is stopped.
+    Returns the result table ranked by mean R2 (complete candidates first).
+    """
+    with profiler.stage('search.features') as stage:
+        features, elements, y, groups = ml.training_arrays()
+        # One-hot categories sorted, as OneHotEncoder orders them
+        categories, codes = np.unique(elements.astype(str), return_inverse=True)
+        X = design_matrix(features, codes, len(categories))
+        stage.rows = len(X)
+    column = {'step': slice(None), 'file': slice(0, 1)}[group_by]
+    labels = np.unique(groups[:, column], axis=0, return_inverse=True)[1].ravel()
+    n_groups = labels.max() + 1
+    if n_groups < 2:
+        raise ValueError(f"Cross-validation by {group_by} needs at least 2 groups, found {n_groups}")
+    n_folds = min(folds, n_groups)
+    splits = list(GroupKFold(n_splits=n_folds).split(X, y, labels))
+
+    print(f"Searching {len(candidates)} configurations: {n_folds}-fold CV by {group_by} "
+          f"({n_groups} groups, {len(X)} rows), stopping at {margin} R2 below the best")
+    scores = [[] for _ in candidates]
+    times = [[] for _ in candidates]
+    stopped = [None] * len(candidates)
+
+    if jobs < 0:
+        jobs = os.cpu_count()
+    pool = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(X, y, splits))
+    else:
+        _init_worker(X, y, splits)
+
+    try:
+        with profiler.stage('search.cv', rows=len(X)):
+            for fold in range(n_folds):
+                active = [i for i in range(len(candidates)) if stopped[i] is None]
+                params = [candidates[i] for i in active]
+                if pool is None:
+                    results = [_fit_fold(p, fold, seed) for p in params]
+                else:
+                    results = list(pool.map(_fit_fold, params, [fold] * len(params), [seed] * len(params)))
+                for i, (score, fit_s) in zip(active, results):
+                    scores[i].append(score)
+                    times[i].append(fit_s)
+
+                means = {i: np.mean(scores[i]) for i in active}
+                best = max(means.values())
+                for i in active:
+                    if fold < n_folds - 1 and means[i] < best - margin:
+                        stopped[i] = fold + 1
+                print(f"  fold {fold + 1}/{n_folds}: {len(active)} evaluated, best mean R2 {best:.4f}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _DATA.clear()
+
+    rows = []
+    for i, params in enumerate(candidates):
+        rows.append({
+            **params,
+            'mean_r2': np.mean(scores[i]),
+            'std_r2': np.std(scores[i]),
+            'folds': len(scores[i]),
+            'fit_s': np.mean(times[i]),
+            'total_s': np.sum(times[i]),
+            'status': 'complete' if stopped[i] is None else f'stopped after {stopped[i]}'
+            })
+    table = pd.DataFrame(rows)
+    table['max_depth'] = table['max_depth'].astype('Int64')
+    table = table.sort_values(['folds', 'mean_r2', 'fit_s'], ascending=[False, False, True], ignore_index=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+    return table
+
+def best_parameters(table):
+    """Hyperparameters of the top-ranked row of a search() table as plain Python values."""
+    best = table.iloc[0]
+    return {
+            'n_estimators': int(best['n_estimators']),
+            'max_depth': None if pd.isna(best['max_depth']) else int(best['max_depth']),
+            'min_samples_split': int(best['min_samples_split'])
+            }
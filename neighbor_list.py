@@ -0,0 +1,152 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+class NeighborList:
+    """
+    Periodic neighbor search within a cutoff for a (possibly triclinic) cell.
+    Atoms are wrapped into the cell, the periodic images needed to cover the cutoff are generated
+    once per lattice, and pairs are found with a KD-tree, so each frame costs ~O(N log N).
+    """
+    def __init__(self, lattice, cutoff=5.0):
+        """
+        lattice: Lattice basis vectors as rows (3, 3) in Angstrom
+        cutoff: Neighbor cutoff radius in Angstrom
+        """
+        self.lattice = np.asarray(lattice, dtype=float)
+        self.inv_lattice = np.linalg.inv(self.lattice)
+        self.cutoff = cutoff
+
+        # Images needed along each lattice vector: cutoff over the perpendicular cell height, plus one
+        # because wrapped fractional coordinates of a pair can differ by up to one cell
+        volume = abs(np.linalg.det(self.lattice))
+        areas = np.linalg.norm(np.cross(self.lattice[[1, 2, 0]], self.lattice[[2, 0, 1]]), axis=1)
+        reps = np.floor(cutoff / (volume / areas)).astype(int) + 1
+        grid = np.meshgrid(*[np.arange(-r, r + 1) for r in reps], indexing='ij')
+        self.shifts = np.stack(grid, axis=-1).reshape(-1, 3) @ self.lattice
+
+    def to_cartesian(self, positions, coordinate_system="Direct"):
+        """Wraps positions into the cell and returns Cartesian coordinates."""
+        positions = np.asarray(positions, dtype=float)
+        if coordinate_system.lower().startswith('d'):
+            frac = positions
+        else:
+            frac = positions @ self.inv_lattice
+        return (frac % 1.0) @ self.lattice
+
+    def build(self, positions, coordinate_system="Direct"):
+        """
+        Finds all pairs within the cutoff (including periodic images), sorted by central atom.
+        Returns (i, j, vectors, distances): vectors point from atom i to the relevant image of atom j.
+        """
+        cart = self.to_cartesian(positions, coordinate_system)
+        n_atoms = len(cart)
+        images = (self.shifts[:, None, :] + cart[None, :, :]).reshape(-1, 3)
+
+        pairs = cKDTree(cart).sparse_distance_matrix(cKDTree(images), self.cutoff, output_type='ndarray')
+        pairs = pairs[pairs['v'] > 1e-8] # Drop each atom's own zero-shift image
+        pairs = pairs[np.argsort(pairs['i'], kind='stable')]
+
+        i = pairs['i'].astype(np.int64)
+        image = pairs['j'].astype(np.int64)
+        vectors = images[image] - cart[i]
+        return i, image % n_atoms, vectors, pairs['v']
+
+class LocalDescriptors:
+    """
+    Per-atom local-environment descriptors computed in vectorized form from a periodic neighbor list:
+    - radial: species-resolved G2 functions sum_j exp(-eta r_ij^2) fc(r_ij)
+    - angular: G5-type functions sum_{j<k} 2^(1-zeta) (1 + lambda cos theta_ijk)^zeta exp(-eta (r_ij^2 + r_ik^2)) fc fc
+    - vector: force-covariant components sum_j (r_ij^a / r_ij) exp(-eta r_ij^2) fc(r_ij) for a = x, y, z
+    The radial/angular blocks are invariant to translations and rotations; the vector block turns
+    with the structure, which lets a regressor predict force directions.
+    """
+    def __init__(self, species, cutoff=5.0, etas=(0.05, 0.2, 0.5, 1.0, 2.0), zetas=(1, 4), angular_eta=0.05):
+        """
+        species: Element symbols that get their own radial channel
+        cutoff: Neighbor cutoff radius in Angstrom
+        etas: Gaussian widths (1/A^2) for the radial and vector blocks
+        zetas: Angular resolution exponents (each used with lambda = +1 and -1)
+        angular_eta: Gaussian width for the angular block
+        """
+        self.species = list(species)
+        self.cutoff = cutoff
+        self.etas = np.asarray(etas, dtype=float)
+        self.zetas = tuple(zetas)
+        self.angular_eta = angular_eta
+
+    @property
+    def feature_names(self):
+        names = [f"g2_{s}_{eta:g}" for s in self.species for eta in self.etas]
+        names += [f"g5_{zeta}_{'+' if lam > 0 else '-'}" for zeta in self.zetas for lam in (1, -1)]
+        names += [f"v{axis}_{eta:g}" for axis in 'xyz' for eta in self.etas]
+        return names
+
+    @property
+    def n_features(self):
+        return len(self.feature_names)
+
+    def _cutoff_function(self, d):
+        return 0.5 * (np.cos(np.pi * d / self.cutoff) + 1.0)
+
+    def compute(self, neighbor_list, positions, symbols, coordinate_system="Direct"):
+        """Descriptors of one frame: (n_atoms, n_features)."""
+        n_atoms = len(positions)
+        n_species = len(self.species)
+        i, j, vectors, d = neighbor_list.build(positions, coordinate_system)
+
+        species_index = {s: k for k, s in enumerate(self.species)}
+        atom_species = np.array([species_index.get(s, -1) for s in symbols])
+        fc = self._cutoff_function(d)
+        units = vectors / d[:, None]
+        # (n_pairs, n_etas) radial weights shared by the radial and vector blocks
+        weights = np.exp(-np.outer(d ** 2, self.etas)) * fc[:, None]
+
+        # Radial: bin by (central atom, neighbour species); unknown species are ignored
+        s_j = atom_species[j]
+        known = s_j >= 0
+        slot = i[known] * n_species + s_j[known]
+        radial = np.stack([
+            np.bincount(slot, weights=weights[known, e], minlength=n_atoms * n_species)
+            for e in range(len(self.etas))
+            ], axis=-1).reshape(n_atoms, n_species * len(self.etas))
+
+        # Angular: all neighbour pairs (p, q), p < q, that share the central atom
+        degree = np.bincount(i, minlength=n_atoms)
+        starts = np.cumsum(degree) - degree
+        per_pair = degree[i]
+        p = np.repeat(np.arange(len(i)), per_pair)
+        q = starts[i[p]] + np.arange(len(p)) - np.repeat(np.cumsum(per_pair) - per_pair, per_pair)
+        keep = p < q
+        p, q = p[keep], q[keep]
+        cos_theta = np.einsum('ij,ij->i', units[p], units[q])
+        radial_part = np.exp(-self.angular_eta * (d[p] ** 2 + d[q] ** 2)) * fc[p] * fc[q]
+        angular = np.stack([
+            np.bincount(i[p], weights=2.0 ** (1 - zeta) * (1 + lam * cos_theta) ** zeta * radial_part, minlength=n_atoms)
+            for zeta in self.zetas for lam in (1, -1)
+            ], axis=-1)
+
+        # Vector: direction-weighted radial sums per Cartesian axis
+        vector = np.concatenate([
+            np.stack([np.bincount(i, weights=units[:, axis] * weights[:, e], minlength=n_atoms)
+                      for e in range(len(self.etas))], axis=-1)
+            for axis in range(3)
+            ], axis=-1)
+
+        return np.hstack([radial, angular, vector])
+
+    def compute_frames(self, lattice, frames, symbols, coordinate_system="Direct"):
+        """
+        Descriptors for every frame of a trajectory sharing one lattice: (n_frames, n_atoms, n_features).
+        The periodic image set is built once; each frame is then linear in its neighbour count.
+        """
+        neighbor_list = NeighborList(lattice, self.cutoff)
+        frames = np.asarray(frames, dtype=float)
+        out = np.empty((len(frames), frames.shape[1], self.n_features))
+        for k, positions in enumerate(frames):
+            out[k] = self.compute(neighbor_list, positions, symbols, coordinate_system)
+        return out
+
+    def featurize(self, trajectory):
+        """Descriptors for every frame of a Trajectory (uses its lattice and coordinate type)."""
+        lattice = trajectory.lattice if trajectory.lattice is not None else np.eye(3)
+        return self.compute_frames(lattice, trajectory.positions, trajectory.symbols, trajectory.coordinate_type)
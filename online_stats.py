@@ -0,0 +1,200 @@
+import math
+import numpy as np
+import pandas as pd
+
+from vasp_parser import iter_chunks
+
+DESCRIBE_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+STRESS_COLUMNS = ['stress_xx', 'stress_yy', 'stress_zz']
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with rank error guarantees (KLL, Karnin, Lang & Liberty, FOCS 2016).
+    Values are kept in levels where an item at level h stands for 2^h inputs; a level over its
+    capacity is sorted and every other item (random offset) moves up one level. The error is a
+    fraction of the rank, so it scales with the spread of the data and not with its magnitude or
+    offset, and up to k values are kept exactly. Sketches merge by concatenating their levels.
+    """
+    def __init__(self, k=2048, seed=None):
+        """
+        k: Capacity of the top level; the rank error is roughly 1.7 / k of the count
+        seed: Seed of the random compaction offsets
+        """
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        """Lower levels get geometrically smaller capacities (factor 2/3 per level)."""
+        return max(2, int(math.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # An odd item out stays behind so the total weight is preserved
+                odd = len(level) % 2
+                promoted = level[odd:][self.rng.integers(2)::2]
+                self.levels[h] = level[:odd]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        """Adds an array of values (NaN excluded by the caller)."""
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other):
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile(s), interpolated between neighbouring ranks like
+        pandas' default (linear) method. NaN for an empty sketch.
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.count == 0:
+            return np.full(len(q), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+
+        rank = q * (self.count - 1)
+        lo = np.floor(rank).astype(np.int64)
+        hi = np.minimum(lo + 1, self.count - 1)
+        v_lo = values[np.searchsorted(cumulative, lo, side='right')]
+        v_hi = values[np.searchsorted(cumulative, hi, side='right')]
+        return v_lo + (rank - lo) * (v_hi - v_lo)
+
+class RunningStats:
+    """
+    Streaming count/mean/std/min/max/quartiles of one column. Moments are combined per batch with
+    the parallel form of Welford's update (Chan et al.), so updates and merges are exact up to
+    rounding; quartiles come from a QuantileSketch. NaN values are skipped, as in describe().
+    """
+    def __init__(self, k=2048):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(k)
+
+    def _combine(self, count, mean, m2, lo, hi):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    def update(self, values):
+        """Adds a batch of values (one step, one chunk or a whole column)."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+        self.sketch.update(values)
+
+    def merge(self, other):
+        """Adds the values summarized by another RunningStats (e.g. from another file or worker)."""
+        if other.count == 0:
+            return
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, as pandas)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def describe(self, name=None):
+        """Series shaped like pandas.Series.describe(); quartiles are clamped to the exact min/max."""
+        if self.count == 0:
+            return pd.Series([0.0] + [np.nan] * 7, index=DESCRIBE_INDEX, name=name)
+        quartiles = np.clip(self.sketch.quantile([0.25, 0.5, 0.75]), self.min, self.max)
+        return pd.Series([float(self.count), self.mean, self.std, self.min, *quartiles, self.max],
+                         index=DESCRIBE_INDEX, name=name)
+
+class TrajectoryStats:
+    """
+    Accumulates the statistics that Analyzer prints (force magnitudes per atom; drift, energy,
+    pressure and stress per step) from Trajectory pieces without keeping them. Instances merge,
+    so files can be summarized in separate processes and combined afterwards.
+    """
+    COLUMNS = ['magnitude', 'drift', 'energy', 'pressure'] + STRESS_COLUMNS
+
+    def __init__(self, k=2048):
+        """k: Quantile sketch size per column (see QuantileSketch); columns with up to k values are exact"""
+        self.columns = {name: RunningStats(k) for name in self.COLUMNS}
+        self.has_stress = False
+
+    def update(self, traj):
+        """Adds a Trajectory (a whole run, a chunk or a single step)."""
+        if traj.n_steps == 0:
+            return
+        self.columns['magnitude'].update(traj.magnitude)
+        self.columns['drift'].update(np.linalg.norm(traj.drift, axis=1))
+        self.columns['energy'].update(traj.energy)
+        if traj.stress is not None:
+            self.has_stress = True
+            self.columns['pressure'].update(traj.pressure)
+            diag = traj.stress_diag
+            for i, name in enumerate(STRESS_COLUMNS):
+                self.columns[name].update(diag[:, i])
+
+    def merge(self, other):
+        for name, stats in self.columns.items():
+            stats.merge(other.columns[name])
+        self.has_stress = self.has_stress or other.has_stress
+        return self
+
+    def force_stats(self):
+        return self.columns['magnitude'].describe('magnitude')
+
+    def drift_stats(self):
+        return self.columns['drift'].describe('Drift Magnitude')
+
+    def energy_stats(self):
+        return self.columns['energy'].describe('energy')
+
+    def pressure_stats(self):
+        if self.has_stress:
+            return self.columns['pressure'].describe('pressure')
+        return "No Pressure data found."
+
+    def stress_stats(self):
+        if self.has_stress:
+            return pd.DataFrame({name: self.columns[name].describe() for name in STRESS_COLUMNS})
+        return "No Stress data found."
+
+def file_stats(filepath, chunk_steps=256, cache=None):
+    """
+    Worker: TrajectoryStats of one file, read chunk_steps ionic steps at a time
+    (see vasp_parser.iter_chunks). Returns (stats, number of atom rows).
+    """
+    stats = TrajectoryStats()
+    rows = 0
+    for chunk in iter_chunks(filepath, chunk_steps, cache):
+        stats.update(chunk)
+        rows += chunk.n_steps * chunk.n_atoms
+    return stats, rows
@@ -0,0 +1,148 @@
+import numpy as np
+
+class SteepestDescent:
+    """
+    Fixed-step steepest descent: x += learning_rate * F.
+    Works in the generator's input coordinates (the original StructureGenerator behaviour).
+    """
+    cartesian = False
+
+    def __init__(self, n_structures, learning_rate=0.1, max_step=None):
+        self.learning_rate = learning_rate
+
+    def step(self, index, positions, forces):
+        """Returns new positions for structures `index` given their positions and forces (k, n_atoms, 3)."""
+        return positions + self.learning_rate * forces
+
+class FIRE:
+    """
+    Fast Inertial Relaxation Engine (Bitzek et al., PRL 97, 170201), batched: every structure keeps
+    its own velocity, time step and mixing parameter. Works in Cartesian coordinates (Angstrom).
+    """
+    cartesian = True
+
+    def __init__(self, n_structures, learning_rate=0.1, max_step=0.2, dt_max=1.0, n_min=5,
+                 f_inc=1.1, f_dec=0.5, a_start=0.1, f_a=0.99):
+        """
+        learning_rate: Initial time step
+        max_step: Largest displacement norm of one structure per step (Angstrom)
+        """
+        self.max_step = max_step
+        self.dt_max = dt_max
+        self.n_min = n_min
+        self.f_inc = f_inc
+        self.f_dec = f_dec
+        self.a_start = a_start
+        self.f_a = f_a
+        self.v = None
+        self.dt = np.full(n_structures, float(learning_rate))
+        self.a = np.full(n_structures, a_start)
+        self.n_positive = np.zeros(n_structures, dtype=int)
+        self.started = np.zeros(n_structures, dtype=bool)
+
+    def step(self, index, positions, forces):
+        if self.v is None:
+            self.v = np.zeros((len(self.dt),) + positions.shape[1:])
+        v = self.v[index]
+        dt, a, n_positive = self.dt[index], self.a[index], self.n_positive[index]
+
+        power = np.einsum('kij,kij->k', forces, v)
+        uphill = (power <= 0) & self.started[index] # The first step starts from rest
+        f_norm = np.sqrt(np.einsum('kij,kij->k', forces, forces))
+        v_norm = np.sqrt(np.einsum('kij,kij->k', v, v))
+        mix = (a * v_norm / np.maximum(f_norm, 1e-12))[:, None, None]
+        v = np.where(uphill[:, None, None], 0.0, (1 - a[:, None, None]) * v + mix * forces)
+
+        accelerate = ~uphill & (n_positive > self.n_min)
+        dt = np.where(accelerate, np.minimum(dt * self.f_inc, self.dt_max), dt)
+        a = np.where(accelerate, a * self.f_a, a)
+        dt = np.where(uphill, dt * self.f_dec, dt)
+        a = np.where(uphill, self.a_start, a)
+        n_positive = np.where(uphill, 0, n_positive + 1)
+
+        v = v + dt[:, None, None] * forces
+        dr = dt[:, None, None] * v
+        norm = np.sqrt(np.einsum('kij,kij->k', dr, dr))
+        dr *= np.minimum(1.0, self.max_step / np.maximum(norm, 1e-12))[:, None, None]
+
+        self.v[index] = v
+        self.dt[index], self.a[index], self.n_positive[index] = dt, a, n_positive
+        self.started[index] = True
+        return positions + dr
+
+class LBFGS:
+    """
+    Limited-memory BFGS without line search (as in ASE), batched: each structure keeps its own
+    history of the last `memory` steps. Curvature-violating pairs (s.y <= 0), which a piecewise
+    constant forest can produce, are not added to the history. Works in Cartesian coordinates (Angstrom).
+    """
+    cartesian = True
+
+    def __init__(self, n_structures, learning_rate=None, max_step=0.2, memory=10, alpha=70.0):
+        """
+        max_step: Largest single-atom displacement per step (Angstrom)
+        memory: Number of (s, y) pairs kept per structure
+        alpha: Initial Hessian guess (eV/A^2) for the first step, H0 = 1 / alpha
+        """
+        self.n_structures = n_structures
+        self.max_step = max_step
+        self.memory = memory
+        self.h0 = 1.0 / alpha
+        self.s = None
+        self.y = None
+        self.rho = np.zeros((n_structures, memory))
+        self.r0 = None
+        self.f0 = None
+        self.started = np.zeros(n_structures, dtype=bool)
+
+    def _update(self, index, positions, forces):
+        """Adds the (s, y) pair from the previous step of each structure to its history."""
+        prev = self.started[index]
+        if not prev.any():
+            return
+        rows = index[prev]
+        s = (positions[prev] - self.r0[rows]).reshape(len(rows), -1)
+        y = (self.f0[rows] - forces[prev]).reshape(len(rows), -1) # Gradient difference
+        sy = np.einsum('kd,kd->k', s, y)
+        good = sy > 1e-12
+        rows, s, y, sy = rows[good], s[good], y[good], sy[good]
+        # Oldest pair drops out of slot 0; the newest is always in the last slot
+        self.s[rows] = np.concatenate([self.s[rows, 1:], s[:, None]], axis=1)
+        self.y[rows] = np.concatenate([self.y[rows, 1:], y[:, None]], axis=1)
+        self.rho[rows] = np.concatenate([self.rho[rows, 1:], (1.0 / sy)[:, None]], axis=1)
+
+    def step(self, index, positions, forces):
+        k = len(index)
+        dim = positions[0].size
+        if self.s is None:
+            self.s = np.zeros((self.n_structures, self.memory, dim))
+            self.y = np.zeros((self.n_structures, self.memory, dim))
+            self.r0 = np.zeros((self.n_structures,) + positions.shape[1:])
+            self.f0 = np.zeros((self.n_structures,) + positions.shape[1:])
+        self._update(index, positions, forces)
+
+        # Two-loop recursion on all structures at once; empty history slots have rho = 0
+        s, y, rho = self.s[index], self.y[index], self.rho[index]
+        q = -forces.reshape(k, dim)
+        alpha = np.zeros((k, self.memory))
+        for i in range(self.memory - 1, -1, -1):
+            alpha[:, i] = rho[:, i] * np.einsum('kd,kd->k', s[:, i], q)
+            q -= alpha[:, i, None] * y[:, i]
+        # Initial Hessian scaled by the newest curvature pair (Nocedal & Wright 7.20), 1/alpha before any pair
+        yy = np.einsum('kd,kd->k', y[:, -1], y[:, -1])
+        gamma = np.where(rho[:, -1] > 0, 1.0 / np.maximum(rho[:, -1] * yy, 1e-300), self.h0)
+        z = gamma[:, None] * q
+        for i in range(self.memory):
+            beta = rho[:, i] * np.einsum('kd,kd->k', y[:, i], z)
+            z += s[:, i] * (alpha[:, i] - beta)[:, None]
+
+        dr = -z.reshape(positions.shape)
+        longest = np.sqrt((dr ** 2).sum(axis=2)).max(axis=1)
+        dr *= np.minimum(1.0, self.max_step / np.maximum(longest, 1e-12))[:, None, None]
+
+        self.r0[index] = positions
+        self.f0[index] = forces
+        self.started[index] = True
+        return positions + dr
+
+OPTIMIZERS = {'sd': SteepestDescent, 'fire': FIRE, 'lbfgs': LBFGS}
@@ -0,0 +1,173 @@
+import mmap
+import re
+import numpy as np
+
+from compression import is_compressed, open_input
+from vasp_parser import TrajectoryReader
+from trajectory import Trajectory
+
+_FLOAT = rb'[-+]?(?:\d+\.\d*|\.\d+)(?:[Ee][-+]?\d+)?'
+# Data rows of a force table start right after the dashed rule under the header
+FORCE_HEADER = re.compile(rb'POSITION\s+TOTAL-FORCE \(eV/Angst\)[^\n]*\n[ -]*\n')
+# Ionic free energy (electronic iterations print "free energy    TOTEN" with single spacing)
+ENERGY = re.compile(rb'free  energy   TOTEN\s*=\s*(' + _FLOAT + rb')')
+STRESS = re.compile(rb'in kB((?:\s+' + _FLOAT + rb'){6})')
+TITEL = re.compile(rb'TITEL\s*=\s*\S+\s+([A-Za-z]+)')
+IONS_PER_TYPE = re.compile(rb'ions per type =([ \d]+)')
+
+class _Buffer(bytes):
+    """Decompressed file contents usable in place of an mmap (context manager, find/rfind, regex)."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class OutcarParser(TrajectoryReader):
+    """
+    Reads an OUTCAR through the TrajectoryReader interface shared with VaspParser (extract_arrays/
+    extract_trajectory/extract_data, extract_basis, iter_trajectory_chunks, symbols/atom_types/counts,
+    coordinate_type).
+    The file is memory-mapped (decompressed into memory for .gz/.bz2/.xz) and scanned with compiled byte-level regexes; the fixed-width
+    POSITION/TOTAL-FORCE tables of all steps are decoded with a single NumPy conversion.
+    OUTCAR positions are Cartesian.
+    """
+    def __init__(self, filepath, last_step_only=False):
+        """
+        filepath: Path to OUTCAR
+        last_step_only: Decode only the final complete ionic step (reported under its real step index)
+        """
+        self.last_step_only = last_step_only
+        self._data = None # Decompressed contents of a compressed file, read once (see _map)
+        super().__init__(filepath)
+
+    def _map(self):
+        """
+        Memory map of the file; compressed files are decompressed into memory instead, once per
+        parser, and the buffer is shared by all later calls.
+        """
+        if is_compressed(self.filepath):
+            if self._data is None:
+                with open_input(self.filepath) as f:
+                    data = _Buffer(f.read())
+                if not data:
+                    raise ValueError(f"{self.filepath} is empty")
+                self._data = data
+            return self._data
+        with open(self.filepath, 'rb') as f:
+            if f.seek(0, 2) == 0:
+                raise ValueError(f"{self.filepath} is empty")
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _open(self):
+        """Reads element types and counts from the header (TITEL and 'ions per type' lines)."""
+        self.coordinate_type = "Cartesian"
+        with self._map() as mm:
+            head_end = mm.find(b'Iteration')
+            head_end = len(mm) if head_end < 0 else head_end
+            self.atom_types = [t.decode() for t in TITEL.findall(mm, 0, head_end)]
+            ions = IONS_PER_TYPE.search(mm, 0, head_end)
+            self.counts = [int(c) for c in ions.group(1).split()] if ions else []
+        if len(self.counts) != len(self.atom_types):
+            raise ValueError(f"{self.filepath}: {len(self.atom_types)} TITEL lines but counts {self.counts}")
+        self.symbols = [e for e, c in zip(self.atom_types, self.counts) for _ in range(c)]
+
+    def _scan(self, mm):
+        """
+        Byte offsets of every complete force table: (headers, starts, ends).
+        A table still being written (no closing rule yet) is left out.
+        """
+        headers, starts, ends = [], [], []
+        for match in FORCE_HEADER.finditer(mm):
+            start = match.end()
+            end = mm.find(b' ---', start)
+            if end < 0:
+                break
+            headers.append(match.start())
+            starts.append(start)
+            ends.append(end)
+        return np.array(headers, dtype=np.int64), starts, ends
+
+    def _decode(self, mm, headers, starts, ends, select):
+        """Decodes the force tables `select` (indices into the scan) plus their energy and stress."""
+        n_atoms = len(self.symbols)
+        blocks = b"".join(mm[starts[k]:ends[k]] for k in select)
+        table = np.array(blocks.split(), dtype=float)
+        if table.size != len(select) * n_atoms * 6:
+            raise ValueError(f"{self.filepath}: force tables do not match {n_atoms} atoms")
+        table = table.reshape(len(select), n_atoms, 6)
+
+        # Per ionic step the stress precedes the force table and the ionic energy follows it
+        bounds = np.append(headers, len(mm))
+        energy_pos, energy_val = [], []
+        stress_pos, stress_val = [], []
+        lo = headers[select[0] - 1] if select[0] > 0 else 0
+        hi = bounds[select[-1] + 1]
+        for m in ENERGY.finditer(mm, lo, hi):
+            energy_pos.append(m.start())
+            energy_val.append(float(m.group(1)))
+        for m in STRESS.finditer(mm, lo, hi):
+            stress_pos.append(m.start())
+            stress_val.append(m.group(1))
+        energy_pos = np.array(energy_pos, dtype=np.int64)
+        stress_pos = np.array(stress_pos, dtype=np.int64)
+
+        select = np.asarray(select)
+        own = headers[select]
+        following = bounds[select + 1]
+        preceding = np.where(select > 0, headers[np.maximum(select - 1, 0)], -1)
+
+        # First energy after each table (before the next one), last stress before it (after the previous one)
+        energy = np.full(len(select), np.nan)
+        if len(energy_pos):
+            e = np.searchsorted(energy_pos, own)
+            found = (e < len(energy_pos)) & (energy_pos[np.minimum(e, len(energy_pos) - 1)] < following)
+            energy[found] = np.asarray(energy_val)[e[found]]
+
+        stress = None
+        if len(stress_pos):
+            s = np.searchsorted(stress_pos, own) - 1
+            found = (s >= 0) & (stress_pos[np.maximum(s, 0)] > preceding)
+            if found.any():
+                stress_val = np.array(b" ".join(stress_val).split(), dtype=float).reshape(-1, 6)
+                xx, yy, zz, xy, yz, zx = stress_val[s[found]].T
+                stress = np.full((len(select), 3, 3), np.nan)
+                stress[found] = np.stack([xx, xy, zx, xy, yy, yz, zx, yz, zz], axis=-1).reshape(-1, 3, 3)
+
+        return {
+                'steps': np.asarray(select, dtype=np.int64),
+                'positions': np.ascontiguousarray(table[:, :, :3]),
+                'forces': np.ascontiguousarray(table[:, :, 3:]),
+                'energy': energy,
+                'stress': stress
+                }
+
+    def _extract_arrays(self):
+        with self._map() as mm:
+            headers, starts, ends = self._scan(mm)
+            if len(headers) == 0:
+                return {'steps': np.empty(0, dtype=np.int64), 'positions': np.empty((0, len(self.symbols), 3)),
+                        'forces': np.empty((0, len(self.symbols), 3)), 'energy': np.empty(0), 'stress': None}
+            select = [len(headers) - 1] if self.last_step_only else list(range(len(headers)))
+            return self._decode(mm, headers, starts, ends, select)
+
+    def iter_trajectory_chunks(self, chunk_steps=256):
+        """Yields the run as Trajectory pieces of at most chunk_steps steps, decoding one chunk at a time."""
+        lattice = self.extract_basis()
+        with self._map() as mm:
+            headers, starts, ends = self._scan(mm)
+            for first in range(0, len(headers), chunk_steps):
+                arrays = self._decode(mm, headers, starts, ends, list(range(first, min(first + chunk_steps, len(headers)))))
+                yield Trajectory(arrays['positions'], arrays['forces'], self.symbols, steps=arrays['steps'],
+                                 energy=arrays['energy'], stress=arrays['stress'], file_source=self.filepath,
+                                 lattice=lattice, coordinate_type=self.coordinate_type)
+
+    def extract_basis(self):
+        """Final lattice: the last 'direct lattice vectors' block of the file."""
+        with self._map() as mm:
+            pos = mm.rfind(b'direct lattice vectors')
+            if pos < 0:
+                return np.eye(3)
+            start = mm.find(b'\n', pos) + 1
+            lines = bytes(mm[start:start + 400]).split(b'\n')[:3]
+        return np.array([line.split()[:3] for line in lines], dtype=float)
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+
+CACHE_VERSION = 1
+MODEL_DIR = 'models' # Trained-model cache of MLModel.train, inside the cache directory
+
+def default_cache_dir():
+    """Per-user cache location (honours XDG_CACHE_HOME)."""
+    base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'vasp_forces_analysis')
+
+def _memmap_members(entry, npz):
+    """
+    Arrays of an uncompressed .npz (np.savez) as memory maps: each member is a stored .npy file,
+    so its data starts at a fixed offset of the archive. Compressed or empty members are read.
+    """
+    arrays = {}
+    with zipfile.ZipFile(entry) as zf, open(entry, 'rb') as raw:
+        for info in zf.infolist():
+            key = info.filename[:-len('.npy')]
+            if key == 'meta':
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[key] = npz[key]
+                continue
+            # Local file header: 30 fixed bytes, then the file name and extra field
+            raw.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', raw.read(4))
+            raw.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            if np.prod(shape) == 0 or dtype.hasobject:
+                arrays[key] = npz[key]
+                continue
+            arrays[key] = np.memmap(entry, dtype=dtype, mode='r', offset=raw.tell(), shape=shape,
+                                    order='F' if fortran_order else 'C')
+    return arrays
+
+class ParseCache:
+    """
+    On-disk cache of parsed trajectories (output of vasp_parser.parse_file) stored as .npz sidecars.
+    Entries are keyed by absolute path, size and mtime (optionally a content hash), so a modified
+    file never hits a stale entry. The cache is trimmed to max_bytes, evicting least recently used entries;
+    the limit covers both the parsed trajectories and the trained models in model_dir.
+    """
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024**3, content_hash=False):
+        """
+        cache_dir: Directory for cache files (default: ~/.cache/vasp_forces_analysis)
+        max_bytes: Size limit of the whole cache directory
+        content_hash: Also hash file contents (robust against mtime-preserving copies, but reads the file)
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.content_hash = content_hash
+
+    @property
+    def model_dir(self):
+        """Directory for MLModel.train(cache_dir=...) model files, under the same size limit."""
+        return os.path.join(self.cache_dir, MODEL_DIR)
+
+    def _entries(self):
+        """Paths of all cache files: parsed trajectories (*.npz) and cached models (models/*.joblib)."""
+        paths = []
+        for directory, suffix in ((self.cache_dir, '.npz'), (self.model_dir, '.joblib')):
+            if os.path.isdir(directory):
+                paths += [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(suffix)]
+        return paths
+
+    def _path_key(self, filepath):
+        return hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()[:16]
+
+    def fingerprint(self, filepath):
+        """Fingerprint of the file's current state."""
+        st = os.stat(filepath)
+        h = hashlib.sha1(f"{CACHE_VERSION}:{st.st_size}:{st.st_mtime_ns}".encode())
+        if self.content_hash:
+            with open(filepath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        return h.hexdigest()[:16]
+
+    def _entry_path(self, filepath, fingerprint=None):
+        if fingerprint is None:
+            fingerprint = self.fingerprint(filepath)
+        return os.path.join(self.cache_dir, f"{self._path_key(filepath)}_{fingerprint}.npz")
+
+    def load(self, filepath, mmap=False, fingerprint=None):
+        """
+        Returns the cached parse_file() dict for filepath, or None on a miss.
+        mmap: Return the arrays as read-only memory maps into the entry instead of reading them,
+              so slicing a large entry only reads the slices that are used
+        fingerprint: Precomputed fingerprint() of the file (default: computed now)
+        """
+        entry = self._entry_path(filepath, fingerprint)
+        if not os.path.exists(entry):
+            return None
+        try:
+            with np.load(entry, allow_pickle=False) as npz:
+                meta = json.loads(str(npz['meta']))
+                if mmap:
+                    parsed = _memmap_members(entry, npz)
+                else:
+                    parsed = {key: npz[key] for key in npz.files if key != 'meta'}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            # Corrupt or partially written entry: treat as a miss
+            return None
+
+        try:
+            os.utime(entry) # Mark as recently used for eviction
+        except OSError:
+            # Read-only cache directory: the entry is still valid, only its LRU position is stale
+            pass
+        parsed.setdefault('stress', None)
+        parsed.update(meta)
+        parsed['filepath'] = filepath
+        return parsed
+
+    def store(self, filepath, parsed, fingerprint=None):
+        """
+        Writes parsed arrays for filepath, replacing older entries of the same file.
+        fingerprint: fingerprint() taken before the file was read. A file that changes while it is
+                     parsed then leaves an entry under its old state, which the next load misses,
+                     instead of old data under the new state (default: computed now)
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = self._entry_path(filepath, fingerprint)
+
+        meta = {
+                'symbols': list(parsed['symbols']),
+                'atom_types': list(parsed['atom_types']),
+                'counts': [int(c) for c in parsed['counts']],
+                'coordinate_type': parsed['coordinate_type']
+                }
+        arrays = {key: parsed[key] for key in ('steps', 'positions', 'forces', 'energy', 'basis')}
+        if parsed['stress'] is not None:
+            arrays['stress'] = parsed['stress']
+
+        # Write to a temporary name first so concurrent readers never see a partial file
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, entry)
+
+        self._invalidate_others(filepath, entry)
+        self.evict()
+
+    def _invalidate_others(self, filepath, keep):
+        prefix = self._path_key(filepath) + '_'
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith('.npz') and path != keep:
+                self._remove(path)
+
+    def evict(self):
+        """Deletes least recently used entries (trajectories and models) until the cache fits into max_bytes."""
+        entries = []
+        for path in self._entries():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Removes every cache entry, including cached models."""
+        for path in self._entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,32 +1,98 @@
+import io
+import os
+import tarfile
 import numpy as np
 
+def _format_rows(rows):
+    """Formats an (n, 3) block in one string operation (same text as per-row ' {:.10f} {:.10f} {:.10f}')."""
+    rows = np.asarray(rows, dtype=float)
+    return (" %.10f %.10f %.10f\n" * len(rows)) % tuple(rows.ravel())
+
 class PoscarWriter:
     @staticmethod
-    def write(filename, lattice, positions, elements, counts, coordinate_system="Direct", title="Generated by ML"):
+    def format(lattice, positions, elements, counts, coordinate_system="Direct", title="Generated by ML"):
+        """Returns the text of a VASP POSCAR file."""
+        coord_line = "Direct" if coordinate_system.lower().startswith('d') else "Cartesian"
+        return (f"{title}\n1.0\n"
+                + _format_rows(lattice)
+                + " ".join(elements) + "\n"
+                + " ".join(map(str, counts)) + "\n"
+                + f"{coord_line}\n"
+                + _format_rows(positions))
+
+    @staticmethod
+    def write(filename, lattice, positions, elements, counts, coordinate_system="Direct", title="Generated by ML", quiet=False):
         """
         Writes a VASP POSCAR file.
         coordinate_system: "Direct" or "Cartesian"
+        quiet: Do not print the saved path
         """
+        text = PoscarWriter.format(lattice, positions, elements, counts, coordinate_system, title)
         with open(filename, 'w') as f:
-            f.write(f"{title}\n")
-            f.write("1.0\n")
+            f.write(text)
+        if not quiet:
+            print(f"Saved {filename}")
 
-            # Write Lattice
-            for row in lattice:
-                f.write(f" {row[0]:.10f} {row[1]:.10f} {row[2]:.10f}\n")
+    @staticmethod
+    def write_many(filenames, lattice, structures, elements, counts, coordinate_system="Direct", titles=None, jobs=1):
+        """
+        Writes one POSCAR per structure with a single summary line instead of a line per file.
+        Each file is formatted in memory and written in one call; with jobs > 1 the writes run in
+        threads, which hides per-file open/close latency on network filesystems.
+        """
+        titles = titles or ["Generated by ML"] * len(structures)
+        def write_one(args):
+            filename, positions, title = args
+            PoscarWriter.write(filename, lattice, positions, elements, counts, coordinate_system, title, quiet=True)
 
-            # Write Elements
-            f.write(" ".join(elements) + "\n")
-            f.write(" ".join(map(str, counts)) + "\n")
+        work = list(zip(filenames, structures, titles))
+        if jobs < 0:
+            jobs = os.cpu_count()
+        if jobs <= 1:
+            for item in work:
+                write_one(item)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
 
-            # Write Coordinate Type
-            if coordinate_system.lower().startswith('d'):
-                f.write("Direct\n")
-            else:
-                f.write("Cartesian\n")
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                list(pool.map(write_one, work))
 
-            # Write Positions
-            for pos in positions:
-                f.write(f" {pos[0]:.10f} {pos[1]:.10f} {pos[2]:.10f}\n")
-        print(f"Saved {filename}")
+        if work:
+            print(f"Saved {len(work)} POSCAR files ({work[0][0]} ... {work[-1][0]})")
 
+    @staticmethod
+    def write_xdatcar(filename, lattice, structures, elements, counts, coordinate_system="Direct", title="Generated by ML"):
+        """
+        Writes all structures as frames of one XDATCAR-style file (fixed cell, Direct coordinates,
+        as VASP writes it); Cartesian structures are converted with the lattice.
+        """
+        lattice = np.asarray(lattice, dtype=float)
+        structures = np.asarray(structures, dtype=float)
+        if not coordinate_system.lower().startswith('d'):
+            structures = structures @ np.linalg.inv(lattice)
+
+        with open(filename, 'w') as f:
+            f.write(f"{title}\n           1\n")
+            f.write(_format_rows(lattice))
+            f.write(" ".join(elements) + "\n")
+            f.write(" ".join(map(str, counts)) + "\n")
+            for idx, positions in enumerate(structures, start=1):
+                f.write(f"Direct configuration= {idx:5d}\n")
+                f.write(_format_rows(positions))
+        print(f"Saved {len(structures)} structures to {filename}")
+
+    @staticmethod
+    def write_archive(filename, names, lattice, structures, elements, counts, coordinate_system="Direct", titles=None):
+        """
+        Writes the structures as POSCAR members of one tar archive (gzip-compressed for .gz/.tgz names),
+        so thousands of structures cost a single file on disk.
+        """
+        titles = titles or ["Generated by ML"] * len(structures)
+        mode = 'w:gz' if filename.endswith(('.gz', '.tgz')) else 'w'
+        with tarfile.open(filename, mode) as tar:
+            for name, positions, title in zip(names, structures, titles):
+                data = PoscarWriter.format(lattice, positions, elements, counts, coordinate_system, title).encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        print(f"Saved {len(names)} POSCAR files to {filename}")
@@ -0,0 +1,117 @@
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+class _NullStage:
+    """Shared no-op stage used while profiling is disabled."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.hook = None
+
+    def __enter__(self):
+        factory = self.profiler.hooks.get(self.name)
+        if factory is not None:
+            self.hook = factory()
+            self.hook.enable()
+        self.cpu0 = time.process_time()
+        self.wall0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall0
+        cpu = time.process_time() - self.cpu0
+        if self.hook is not None:
+            self.hook.disable()
+            self.profiler.hook_results.setdefault(self.name, []).append(self.hook)
+        self.profiler._record(self.name, wall, cpu, self.rows)
+        return False
+
+class Profiler:
+    """
+    Per-stage instrumentation: wall time, CPU time, peak RSS, rows processed and throughput.
+    Stages with the same name are aggregated (e.g. a helper called once per ionic step).
+    While disabled, stage() returns a shared no-op so the hooks in hot methods cost next to nothing.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.hooks = {}
+        self.hook_results = {}
+
+    def enable(self):
+        self.enabled = True
+        self.stages = {}
+        self.hook_results = {}
+
+    def attach(self, stage_name, factory):
+        """
+        Attaches an external profiler to one stage. factory() must return an object with
+        enable()/disable() (e.g. cProfile.Profile, or an adapter around a sampling profiler).
+        """
+        self.hooks[stage_name] = factory
+
+    def stage(self, name, rows=None):
+        """Context manager timing one stage; set `.rows` on the returned object if known only later."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, rows)
+
+    def _record(self, name, wall, cpu, rows):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': None}
+        entry['calls'] += 1
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        if rows is not None:
+            entry['rows'] = (entry['rows'] or 0) + int(rows)
+        entry['rss_peak_mb'] = _peak_rss_mb()
+
+    def report(self):
+        """Structured report: one entry per stage in first-seen order."""
+        stages = []
+        for name, entry in self.stages.items():
+            record = {'stage': name, **entry}
+            if entry['rows'] is not None and entry['wall_s'] > 0:
+                record['rows_per_s'] = entry['rows'] / entry['wall_s']
+            stages.append(record)
+        return {'stages': stages, 'rss_peak_mb': _peak_rss_mb()}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print_summary(self):
+        print(f"{'Stage':<36} {'Calls':>6} {'Wall (s)':>10} {'CPU (s)':>10} {'Rows/s':>12} {'RSS (MB)':>9}")
+        for r in self.report()['stages']:
+            rate = f"{r['rows_per_s']:.0f}" if 'rows_per_s' in r else '-'
+            rss = f"{r['rss_peak_mb']:.0f}" if r['rss_peak_mb'] is not None else '-'
+            print(f"{r['stage']:<36} {r['calls']:>6} {r['wall_s']:>10.4f} {r['cpu_s']:>10.4f} {rate:>12} {rss:>9}")
+
+# Process-wide profiler used by the instrumented modules
+profiler = Profiler()
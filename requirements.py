@@ -4,4 +4,5 @@ scipy
 matplotlib
 seaborn
 scikit-learn
+joblib
 defusedxml
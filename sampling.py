@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+class StratifiedReservoir:
+    """
+    Bounded-memory training-set sampler fed one chunk of rows at a time.
+    Every element (stratum) gets an equal share of the capacity and keeps a uniform reservoir
+    sample (Algorithm R) of its rows, so all files and steps are represented in proportion to
+    their size while rare elements are not crowded out by abundant ones.
+    Memory is fixed at construction time, independent of how many rows are streamed through.
+    """
+    def __init__(self, strata, capacity, n_features, seed=None):
+        """
+        strata: Element symbols (one reservoir each)
+        capacity: Total number of rows kept over all strata
+        n_features: Width of the feature rows
+        seed: Seed for the replacement decisions
+        """
+        self.strata = list(strata)
+        self.per_stratum = max(capacity // max(len(self.strata), 1), 1)
+        self.rng = np.random.default_rng(seed)
+        self.sources = [] # file_source of each file index stored in groups
+        self.X = {s: np.empty((self.per_stratum, n_features)) for s in self.strata}
+        self.y = {s: np.empty((self.per_stratum, 3)) for s in self.strata}
+        self.groups = {s: np.empty((self.per_stratum, 2), dtype=np.int64) for s in self.strata} # (file, step)
+        self.filled = dict.fromkeys(self.strata, 0)
+        self.seen = dict.fromkeys(self.strata, 0)
+
+    def _source_index(self, source):
+        if source not in self.sources:
+            self.sources.append(source)
+        return self.sources.index(source)
+
+    def add(self, X, y, labels, steps, source=None):
+        """
+        Offers a chunk of rows to the reservoirs.
+        X: (n, n_features) features, y: (n, 3) targets, labels: element per row, steps: ionic step per row
+        source: Originating file of the chunk
+        """
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        labels = np.asarray(labels, dtype=object)
+        groups = np.column_stack([np.full(len(X), self._source_index(source)), np.asarray(steps, dtype=np.int64)])
+        for s in pd.unique(labels):
+            if s not in self.seen:
+                raise ValueError(f"Element {s} is not one of the sampling strata {self.strata}")
+            mask = labels == s
+            self._add_stratum(s, X[mask], y[mask], groups[mask])
+
+    def _add_stratum(self, s, X, y, groups):
+        cap = self.per_stratum
+        m = len(X)
+
+        # Fill phase: the first `cap` rows are all kept
+        take = min(cap - self.filled[s], m)
+        if take > 0:
+            window = slice(self.filled[s], self.filled[s] + take)
+            self.X[s][window] = X[:take]
+            self.y[s][window] = y[:take]
+            self.groups[s][window] = groups[:take]
+            self.filled[s] += take
+
+        # Replacement phase: row number t (0-based over the stream) replaces a random slot with probability cap / (t + 1)
+        if take < m:
+            t = self.seen[s] + np.arange(take, m)
+            slot = (self.rng.random(len(t)) * (t + 1)).astype(np.int64)
+            accepted = np.flatnonzero(slot < cap) + take
+            slot = slot[accepted - take]
+            # Several rows of one chunk can hit the same slot; sequentially the last one wins
+            last = len(slot) - 1 - np.unique(slot[::-1], return_index=True)[1]
+            self.X[s][slot[last]] = X[accepted[last]]
+            self.y[s][slot[last]] = y[accepted[last]]
+            self.groups[s][slot[last]] = groups[accepted[last]]
+
+        self.seen[s] += m
+
+    def sample(self):
+        """Returns (X, y, labels, groups) of the kept rows; groups columns are (file index, step)."""
+        X = np.concatenate([self.X[s][:self.filled[s]] for s in self.strata])
+        y = np.concatenate([self.y[s][:self.filled[s]] for s in self.strata])
+        labels = np.concatenate([np.full(self.filled[s], s, dtype=object) for s in self.strata])
+        groups = np.concatenate([self.groups[s][:self.filled[s]] for s in self.strata])
+        return X, y, labels, groups
+
+    def composition(self):
+        """Training-set composition per element: rows seen/kept and the files and steps they come from."""
+        rows = []
+        for s in self.strata:
+            groups = self.groups[s][:self.filled[s]]
+            rows.append({
+                'element': s,
+                'rows_seen': self.seen[s],
+                'rows_sampled': self.filled[s],
+                'fraction': self.filled[s] / self.seen[s] if self.seen[s] else 0.0,
+                'files': len(np.unique(groups[:, 0])),
+                'steps': len(np.unique(groups, axis=0)) if len(groups) else 0
+                })
+        return pd.DataFrame(rows).set_index('element')
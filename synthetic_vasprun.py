@@ -0,0 +1,174 @@
+import argparse
+import numpy as np
+
+def _varray(name, rows, indent):
+    pad = " " * indent
+    lines = [f'{pad}<varray name="{name}" >']
+    lines += [f'{pad} <v> {a:16.8f} {b:16.8f} {c:16.8f} </v>' for a, b, c in rows]
+    lines.append(f'{pad}</varray>')
+    return lines
+
+def _structure(lattice, positions, name=None, indent=1):
+    pad = " " * indent
+    head = f'{pad}<structure name="{name}" >' if name else f'{pad}<structure>'
+    lines = [head, f'{pad} <crystal>']
+    lines += _varray('basis', lattice, indent + 2)
+    lines.append(f'{pad}  <i name="volume">  {abs(np.linalg.det(lattice)):16.8f} </i>')
+    lines += _varray('rec_basis', np.linalg.inv(lattice).T, indent + 2)
+    lines.append(f'{pad} </crystal>')
+    lines += _varray('positions', positions, indent + 1)
+    lines.append(f'{pad}</structure>')
+    return lines
+
+def _relaxation(n_atoms, species, n_steps, include_stress, volume_per_atom, seed):
+    """
+    Synthetic relaxation shared by the vasprun.xml and OUTCAR writers: atoms relax in a harmonic
+    well, so forces, energies and stresses decay the way a relaxation does.
+    Returns the cell, atom layout and per-step (fractional positions, forces, stress or None, energy).
+    """
+    rng = np.random.default_rng(seed)
+    species = list(species)
+    counts = [n_atoms // len(species) + (1 if k < n_atoms % len(species) else 0) for k in range(len(species))]
+    symbols = [s for s, c in zip(species, counts) for _ in range(c)]
+
+    a = (n_atoms * volume_per_atom) ** (1 / 3)
+    lattice = np.eye(3) * a
+    equilibrium = rng.random((n_atoms, 3))
+    displacement = rng.normal(0, 0.1, (n_atoms, 3)) / a # Fractional
+    k_spring = 5.0 # eV/A^2
+
+    initial = equilibrium + displacement
+    frames = []
+    for step in range(n_steps):
+        positions = equilibrium + displacement
+        cart_disp = displacement @ lattice
+        forces = -k_spring * cart_disp + rng.normal(0, 0.005, (n_atoms, 3))
+        forces -= forces.mean(axis=0) # VASP removes the net drift
+        stress = None
+        if include_stress:
+            stress = rng.normal(0, 1.0, (3, 3)) * np.exp(-step / max(n_steps, 1)) * 10
+            stress = (stress + stress.T) / 2
+        energy = -5.0 * n_atoms + 0.5 * k_spring * np.sum(cart_disp ** 2)
+        frames.append((positions, forces, stress, energy))
+
+        # Steepest-descent-like relaxation towards equilibrium
+        displacement = displacement * 0.8 + rng.normal(0, 0.002, (n_atoms, 3)) / a
+
+    return {'species': species, 'counts': counts, 'symbols': symbols, 'lattice': lattice,
+            'initial': initial, 'final': equilibrium + displacement, 'frames': frames}
+
+def write_vasprun(path, n_atoms=32, species=("Si",), n_steps=10, include_stress=True, include_energy=True,
+                  volume_per_atom=20.0, seed=0):
+    """
+    Writes a synthetic vasprun.xml with the same element layout VASP produces
+    (<atominfo>, initialpos/finalpos <structure>s, one <calculation> per ionic step).
+
+    n_atoms: Atoms in the cell (split as evenly as possible over species, in order)
+    species: Element symbols
+    n_steps: Number of ionic steps (<calculation> blocks)
+    include_stress / include_energy: Whether <varray name="stress"> / <energy> blocks are written
+    """
+    run = _relaxation(n_atoms, species, n_steps, include_stress, volume_per_atom, seed)
+    species, counts, symbols, lattice = run['species'], run['counts'], run['symbols'], run['lattice']
+
+    out = ['<?xml version="1.0" encoding="ISO-8859-1"?>', '<modeling>',
+           ' <generator>', '  <i name="program" type="string">vasp </i>',
+           '  <i name="version" type="string">6.4.2  </i>', ' </generator>',
+           ' <incar>', '  <i type="string" name="SYSTEM">synthetic</i>',
+           '  <i type="int" name="IBRION">     2</i>', '  <i type="int" name="NSW">  ' + str(n_steps) + '</i>',
+           ' </incar>',
+           ' <atominfo>', f'  <atoms>     {n_atoms} </atoms>', f'  <types>      {len(species)} </types>',
+           '  <array name="atoms" >', '   <dimension dim="1">ion</dimension>',
+           '   <field type="string">element</field>', '   <field type="int">atomtype</field>', '   <set>']
+    for s in symbols:
+        out.append(f'    <rc><c>{s:<2}</c><c>   {species.index(s) + 1}</c></rc>')
+    out += ['   </set>', '  </array>', '  <array name="atomtypes" >', '   <dimension dim="1">type</dimension>',
+            '   <field type="int">atomspertype</field>', '   <field type="string">element</field>', '   <set>']
+    for s, c in zip(species, counts):
+        out.append(f'    <rc><c>   {c}</c><c>{s:<2}</c></rc>')
+    out += ['   </set>', '  </array>', ' </atominfo>']
+
+    out += _structure(lattice, run['initial'], name="initialpos")
+    for positions, forces, stress, energy in run['frames']:
+        out.append(' <calculation>')
+        out += _structure(lattice, positions, indent=2)
+        out += _varray('forces', forces, 2)
+        if stress is not None:
+            out += _varray('stress', stress, 2)
+        if include_energy:
+            out += ['  <energy>',
+                    f'   <i name="e_fr_energy"> {energy:16.8f} </i>',
+                    f'   <i name="e_wo_entrp"> {energy:16.8f} </i>',
+                    f'   <i name="e_0_energy"> {energy:16.8f} </i>',
+                    '  </energy>']
+        out.append(' </calculation>')
+
+    out += _structure(lattice, run['final'], name="finalpos")
+    out.append('</modeling>')
+
+    with open(path, 'w') as f:
+        f.write("\n".join(out) + "\n")
+    return path
+
+def write_outcar(path, n_atoms=32, species=("Si",), n_steps=10, include_stress=True, include_energy=True,
+                 volume_per_atom=20.0, seed=0):
+    """
+    Writes the OUTCAR of the same synthetic run write_vasprun produces for identical arguments:
+    POTCAR/ions-per-type header, lattice blocks, and per ionic step the stress ("in kB"),
+    POSITION/TOTAL-FORCE table (Cartesian, fixed width) and free energy lines.
+    """
+    run = _relaxation(n_atoms, species, n_steps, include_stress, volume_per_atom, seed)
+    species, counts, lattice = run['species'], run['counts'], run['lattice']
+    rec = np.linalg.inv(lattice).T
+    rule = " " + "-" * 83
+
+    out = [' vasp.6.4.2 20Jul23 (build Oct 17 2026 12:00:00) complex', '']
+    out += [f'   POTCAR:    PAW_PBE {s} 05Jan2001' for s in species]
+    for s in species:
+        out += [f'   VRHFIN ={s}: s p', f'   TITEL  = PAW_PBE {s} 05Jan2001']
+    out += ['', f'   ions per type =  ' + ''.join(f'{c:6d}' for c in counts), '']
+    lattice_block = ['  direct lattice vectors                 reciprocal lattice vectors']
+    lattice_block += [f'  {a[0]:13.9f}{a[1]:13.9f}{a[2]:13.9f}  {b[0]:13.9f}{b[1]:13.9f}{b[2]:13.9f}' for a, b in zip(lattice, rec)]
+    out += lattice_block + ['']
+
+    for step, (positions, forces, stress, energy) in enumerate(run['frames'], start=1):
+        out += [f'--------------------------------------- Iteration {step:6d}(   1)  ---------------------------------------', '',
+                f'  free energy    TOTEN  = {energy + 0.01:18.8f} eV', ''] # Electronic step, not an ionic energy
+        out += ['  VOLUME and BASIS-vectors are now :'] + lattice_block + ['']
+        if stress is not None:
+            out += ['  FORCE on cell =-STRESS in cart. coord.  units (eV):',
+                    '  Direction    XX          YY          ZZ          XY          YZ          ZX',
+                    '  in kB  ' + ''.join(f'{v:12.5f}' for v in (stress[0, 0], stress[1, 1], stress[2, 2],
+                                                                    stress[0, 1], stress[1, 2], stress[2, 0])),
+                    '']
+        out += [' POSITION                                       TOTAL-FORCE (eV/Angst)', rule]
+        cart = positions @ lattice
+        out += [f' {p[0]:12.5f} {p[1]:12.5f} {p[2]:12.5f}    {f[0]:14.6f}{f[1]:14.6f}{f[2]:14.6f}' for p, f in zip(cart, forces)]
+        out += [rule, f'    total drift:                         {0.0:14.6f}{0.0:14.6f}{0.0:14.6f}', '']
+        if include_energy:
+            out += ['  FREE ENERGIE OF THE ION-ELECTRON SYSTEM (eV)', '  ---------------------------------------------------',
+                    f'  free  energy   TOTEN  = {energy:18.8f} eV', '',
+                    f'  energy  without entropy= {energy:18.8f}  energy(sigma->0) = {energy:18.8f}', '']
+
+    with open(path, 'w') as f:
+        f.write("\n".join(out) + "\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic vasprun.xml (or OUTCAR)")
+    parser.add_argument('output', help='Output path')
+    parser.add_argument('--atoms', type=int, default=32, help='Number of atoms')
+    parser.add_argument('--species', nargs='+', default=['Si'], help='Element symbols')
+    parser.add_argument('--steps', type=int, default=10, help='Number of ionic steps')
+    parser.add_argument('--no-stress', dest='stress', action='store_false', help='Omit stress blocks')
+    parser.add_argument('--no-energy', dest='energy', action='store_false', help='Omit energy blocks')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--outcar', action='store_true', help='Write an OUTCAR of the run instead of vasprun.xml')
+    args = parser.parse_args()
+
+    writer = write_outcar if args.outcar else write_vasprun
+    writer(args.output, n_atoms=args.atoms, species=args.species, n_steps=args.steps,
+                  include_stress=args.stress, include_energy=args.energy, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The package uses flat absolute imports between its modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compiled_forest import CompiledForest
+from force_ml import MLModel
+from synthetic_vasprun import write_vasprun
+from trajectory import Trajectory
+from vasp_parser import parse_file
+
+@pytest.mark.parametrize('features', ['xyz', 'local'])
+def test_compiled_forest_matches_pipeline_bit_for_bit(tmp_path, features):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=8, species=('Si', 'O'), n_steps=20)
+    traj = Trajectory.from_parsed(parse_file(path))
+    ml = MLModel(traj, n_estimators=10, features=features, cutoff=4.0, n_jobs=1)
+    ml.train()
+    compiled = CompiledForest.from_pipeline(ml.model, ml.feature_columns)
+
+    # Training frames plus perturbed ones, whose features fall between the split thresholds
+    rng = np.random.default_rng(0)
+    frames = np.concatenate([traj.positions, traj.positions + rng.normal(0, 0.01, traj.positions.shape)])
+    values = ml._feature_values(frames, traj.symbols, traj.lattice, traj.coordinate_type)
+    elements = np.tile(np.asarray(traj.symbols, dtype=object), len(frames))
+
+    # Rows sitting exactly on the float32 rounding of every feature split: sklearn compares the
+    # float32 input with the float64 threshold, which the compiled thresholds must reproduce
+    n_cat = len(compiled.elements)
+    boundary = []
+    for estimator in ml.model.named_steps['regressor'].estimators_:
+        tree = estimator.tree_
+        for node in np.flatnonzero((tree.children_left >= 0) & (tree.feature >= n_cat)):
+            row = values[rng.integers(len(values))].copy()
+            row[tree.feature[node] - n_cat] = np.float32(tree.threshold[node])
+            boundary.append(row)
+    values = np.concatenate([values, boundary])
+    elements = np.concatenate([elements, rng.choice(traj.symbols, len(boundary))])
+
+    X = pd.DataFrame(values, columns=ml.feature_columns)
+    X['element'] = elements
+    expected = ml.model.predict(X)
+    actual = compiled.predict(values, elements)
+    assert np.array_equal(expected, actual)
@@ -0,0 +1,63 @@
+import bz2
+import gzip
+import io
+import lzma
+
+import numpy as np
+import pytest
+
+from compression import PrefetchReader, open_input
+from synthetic_vasprun import write_outcar, write_vasprun
+from vasp_parser import parse_file
+
+COMPRESSORS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+def _compress(path, suffix):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with COMPRESSORS[suffix].open(path + suffix, 'wb') as f:
+        f.write(data)
+    return path + suffix
+
+@pytest.mark.parametrize('suffix', sorted(COMPRESSORS))
+@pytest.mark.parametrize('kind,stream', [('vasprun', False), ('vasprun', True), ('outcar', False)])
+def test_compressed_input_parses_like_plain(tmp_path, suffix, kind, stream):
+    if kind == 'outcar':
+        path = write_outcar(str(tmp_path / 'OUTCAR'), n_atoms=8, species=('Si', 'O'), n_steps=10)
+    else:
+        path = str(tmp_path / 'vasprun.xml')
+        write_vasprun(path, n_atoms=8, species=('Si', 'O'), n_steps=10)
+    plain = parse_file(path, stream=stream)
+    packed = parse_file(_compress(path, suffix), stream=stream)
+    for key in ('steps', 'positions', 'forces', 'energy', 'stress', 'basis'):
+        np.testing.assert_array_equal(packed[key], plain[key])
+    assert packed['symbols'] == plain['symbols']
+
+def test_truncated_input_raises_in_reader(tmp_path):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=8, n_steps=10)
+    packed = _compress(path, '.gz')
+    with open(packed, 'rb') as f:
+        data = f.read()
+    with open(packed, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    with open_input(packed) as f, pytest.raises(EOFError):
+        f.read()
+
+class _Failing(io.RawIOBase):
+    """Source that delivers one chunk and then fails, like a disk error mid-decompression."""
+    def __init__(self):
+        self.calls = 0
+
+    def read(self, size=-1):
+        self.calls += 1
+        if self.calls > 1:
+            raise OSError("read error")
+        return b'x' * size
+
+def test_prefetch_thread_error_reaches_reader():
+    reader = PrefetchReader(_Failing(), chunk_size=16)
+    assert reader.read(16) == b'x' * 16
+    with pytest.raises(OSError, match="read error"):
+        reader.read(16)
+    reader.close()
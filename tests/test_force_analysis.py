@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from synthetic_vasprun import write_vasprun
+from vasp_parser import parse_file
+from trajectory import Trajectory
+from force_analysis import Analyzer
+
+def _pieces(traj, sizes):
+    start = 0
+    for size in sizes:
+        stop = start + size
+        yield Trajectory(traj.positions[start:stop], traj.forces[start:stop], traj.symbols,
+                         steps=traj.steps[start:stop], energy=traj.energy[start:stop],
+                         stress=None if traj.stress is None else traj.stress[start:stop],
+                         file_source=traj.file_source)
+        start = stop
+
+def test_appended_steps_match_full_analyzer(tmp_path):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=4, species=('Si', 'O'), n_steps=50)
+    full = Trajectory.from_parsed(parse_file(path))
+
+    pieces = _pieces(full, [1, 3, 1, 20, 25])
+    analyzer = Analyzer(next(pieces))
+    for piece in pieces:
+        analyzer.append(piece)
+        assert analyzer.last_step()['step'] == piece.steps[-1]
+
+    expected = Analyzer(full)
+    assert analyzer.last_step() == expected.last_step()
+    pd.testing.assert_frame_equal(analyzer.summary, expected.summary)
+    traj = analyzer.trajectories[0]
+    np.testing.assert_array_equal(traj.forces, full.forces)
+    np.testing.assert_array_equal(traj.magnitude, full.magnitude)
+    np.testing.assert_array_equal(traj.stress, full.stress)
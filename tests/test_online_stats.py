@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from online_stats import RunningStats, TrajectoryStats
+from synthetic_vasprun import write_vasprun
+from vasp_parser import parse_file
+from trajectory import Trajectory
+from force_analysis import Analyzer
+
+def _merged(values, n_parts):
+    total = RunningStats()
+    for part in np.array_split(values, n_parts):
+        stats = RunningStats()
+        stats.update(part)
+        total.merge(stats)
+    return total
+
+def test_offset_quartiles_match_describe():
+    # Total energies: a small spread on top of a large offset
+    rng = np.random.default_rng(0)
+    energy = -513.0 + np.cumsum(rng.normal(0, 0.01, 500))
+    energy[::50] = np.nan
+    expected = pd.DataFrame({'energy': energy}).describe()['energy']
+    pd.testing.assert_series_equal(_merged(energy, 7).describe('energy'), expected, rtol=1e-12)
+
+def test_large_offset_quartiles_within_rank_error():
+    rng = np.random.default_rng(1)
+    values = -79.99 + rng.normal(0, 0.05, 200_000)
+    described = _merged(values, 40).describe()
+    ordered = np.sort(values)
+    for label, q in (('25%', 0.25), ('50%', 0.5), ('75%', 0.75)):
+        assert abs(np.searchsorted(ordered, described[label]) / len(values) - q) < 0.005
+    expected = pd.Series(values).describe()
+    for label in ('count', 'mean', 'std', 'min', 'max'):
+        assert np.isclose(described[label], expected[label], rtol=1e-9)
+
+def test_trajectory_stats_match_analyzer(tmp_path):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=4, species=('Si', 'O'), n_steps=60)
+    traj = Trajectory.from_parsed(parse_file(path))
+    analyzer = Analyzer(traj)
+    stats = TrajectoryStats()
+    for chunk in traj.chunks(7):
+        stats.update(chunk)
+
+    pd.testing.assert_series_equal(stats.energy_stats(), analyzer.energy_stats(), rtol=1e-9)
+    pd.testing.assert_series_equal(stats.pressure_stats(), analyzer.pressure_stats(), rtol=1e-9)
+    pd.testing.assert_series_equal(stats.force_stats(), analyzer.force_stats(), rtol=1e-9)
+    pd.testing.assert_frame_equal(stats.stress_stats(), analyzer.stress_stats(), rtol=1e-9)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from synthetic_vasprun import write_outcar, write_vasprun
+from vasp_parser import parse_file
+
+def _write_both(tmp_path, **kwargs):
+    vasprun = str(tmp_path / 'vasprun.xml')
+    outcar = str(tmp_path / 'OUTCAR')
+    write_vasprun(vasprun, **kwargs)
+    write_outcar(outcar, **kwargs)
+    return parse_file(vasprun), parse_file(outcar)
+
+@pytest.mark.parametrize('include_stress', [True, False])
+def test_outcar_matches_vasprun(tmp_path, include_stress):
+    xml, out = _write_both(tmp_path, n_atoms=8, species=('Si', 'O'), n_steps=6, include_stress=include_stress)
+    assert out['symbols'] == xml['symbols'] and out['counts'] == xml['counts']
+    assert out['coordinate_type'] == 'Cartesian'
+    np.testing.assert_array_equal(out['steps'], xml['steps'])
+    np.testing.assert_allclose(out['basis'], xml['basis'], atol=1e-8)
+    # OUTCAR prints Cartesian positions with 5 decimals, forces with 6, stress with 5
+    np.testing.assert_allclose(out['positions'], xml['positions'] @ xml['basis'], atol=1e-5)
+    np.testing.assert_allclose(out['forces'], xml['forces'], atol=1e-6)
+    np.testing.assert_allclose(out['energy'], xml['energy'], atol=1e-8)
+    if include_stress:
+        np.testing.assert_allclose(out['stress'], xml['stress'], atol=1e-5)
+    else:
+        assert out['stress'] is None and xml['stress'] is None
+
+def test_outcar_last_step_only_is_the_final_frame(tmp_path):
+    path = str(tmp_path / 'OUTCAR')
+    write_outcar(path, n_atoms=8, species=('Si', 'O'), n_steps=6)
+    full = parse_file(path)
+    last = parse_file(path, last_step_only=True)
+    # The real step index is reported, as by the full parse
+    np.testing.assert_array_equal(last['steps'], full['steps'][-1:])
+    for key in ('positions', 'forces', 'energy', 'stress'):
+        np.testing.assert_array_equal(last[key], full[key][-1:])
@@ -0,0 +1,33 @@
+import os
+
+from parse_cache import ParseCache
+from synthetic_vasprun import write_vasprun
+from vasp_parser import VaspParser, parse_file
+
+def test_file_replaced_during_parse_is_not_cached_as_new(tmp_path, monkeypatch):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=4, n_steps=5)
+    cache = ParseCache(str(tmp_path / 'cache'))
+
+    extract = VaspParser._extract_arrays
+    def replaced_midway(self):
+        arrays = extract(self)
+        write_vasprun(path, n_atoms=4, n_steps=20)
+        return arrays
+    monkeypatch.setattr(VaspParser, '_extract_arrays', replaced_midway)
+    assert len(parse_file(path, cache=cache)['steps']) == 5
+    monkeypatch.undo()
+
+    assert len(parse_file(path, cache=cache)['steps']) == 20
+
+def test_load_from_read_only_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=4, n_steps=5)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    parse_file(path, cache=cache)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError("Read-only file system")
+    monkeypatch.setattr(os, 'utime', read_only)
+    parsed = cache.load(path)
+    assert parsed is not None and len(parsed['steps']) == 5
@@ -0,0 +1,41 @@
+import gzip
+import numpy as np
+
+from synthetic_vasprun import write_vasprun
+from vasp_parser import VaspTailParser, parse_file
+
+def test_tail_parser_started_before_atominfo_gets_every_step(tmp_path):
+    full = str(tmp_path / 'full.xml')
+    write_vasprun(full, n_atoms=8, species=('Si', 'O'), n_steps=30)
+    with open(full, 'rb') as f:
+        data = f.read()
+    expected = parse_file(full)
+
+    # The run is opened while <atominfo> is still being written; the first poll then sees
+    # the completed header together with a complete <calculation> block
+    path = tmp_path / 'vasprun.xml'
+    path.write_bytes(data[:data.find(b'</atominfo>') - 20])
+    vp = VaspTailParser(str(path))
+    assert vp.symbols == []
+    first = data.find(b'</calculation>') + 20
+    pieces = []
+    for stop in [first] + list(range(first + 3000, len(data), 3000)) + [len(data)]:
+        path.write_bytes(data[:stop])
+        pieces.append(vp.extract_arrays())
+
+    assert vp.finished
+    np.testing.assert_array_equal(np.concatenate([p['steps'] for p in pieces]), np.arange(30))
+    np.testing.assert_array_equal(np.concatenate([p['forces'] for p in pieces]), expected['forces'])
+    np.testing.assert_array_equal(np.concatenate([p['positions'] for p in pieces]), expected['positions'])
+
+def test_last_step_parser_matches_final_frame(tmp_path):
+    path = str(tmp_path / 'vasprun.xml')
+    write_vasprun(path, n_atoms=8, species=('Si', 'O'), n_steps=12)
+    with open(path, 'rb') as f, gzip.open(path + '.gz', 'wb') as g:
+        g.write(f.read())
+    full = parse_file(path)
+    for filepath in (path, path + '.gz'):
+        last = parse_file(filepath, last_step_only=True)
+        np.testing.assert_array_equal(last['steps'], full['steps'][-1:])
+        for key in ('positions', 'forces', 'energy', 'stress'):
+            np.testing.assert_array_equal(last[key], full[key][-1:])
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+class Trajectory:
+    """
+    Array-backed trajectory of a single run.
+    Positions and forces are dense (n_steps, n_atoms, 3) arrays, energy/stress are stored once per step
+    and the element symbols once per atom. The long-format per-atom DataFrame is only built on request.
+    """
+    def __init__(self, positions, forces, symbols, steps=None, energy=None, stress=None, file_source=None,
+                 lattice=None, coordinate_type="Direct"):
+        """
+        positions, forces: (n_steps, n_atoms, 3)
+        symbols: Element symbol per atom (n_atoms,)
+        steps: Ionic step index per frame (default: 0..n_steps-1)
+        energy: Free energy per step (n_steps,), NaN where missing
+        stress: Stress tensor per step (n_steps, 3, 3) in kB, or None
+        file_source: Path of the originating file
+        lattice: Lattice basis vectors as rows (3, 3) (final cell of the run)
+        coordinate_type: "Direct" or "Cartesian" positions
+        """
+        self.positions = np.asarray(positions, dtype=float)
+        self.forces = np.asarray(forces, dtype=float)
+        self.symbols = np.asarray(symbols, dtype=object)
+        n_steps = len(self.positions)
+        self.steps = np.arange(n_steps) if steps is None else np.asarray(steps, dtype=np.int64)
+        self.energy = np.full(n_steps, np.nan) if energy is None else np.asarray(energy, dtype=float)
+        self.stress = None if stress is None else np.asarray(stress, dtype=float)
+        self.file_source = file_source
+        self.lattice = None if lattice is None else np.asarray(lattice, dtype=float)
+        self.coordinate_type = coordinate_type
+        self._magnitude = None
+        self._df = None
+        self._buffers = {} # Backing arrays with spare capacity, grown by extend()
+
+    @classmethod
+    def from_parsed(cls, parsed):
+        """Builds a Trajectory from vasp_parser.parse_file() output."""
+        return cls(
+                parsed['positions'],
+                parsed['forces'],
+                parsed['symbols'],
+                steps=parsed['steps'],
+                energy=parsed['energy'],
+                stress=parsed['stress'],
+                file_source=parsed['filepath'],
+                lattice=parsed['basis'],
+                coordinate_type=parsed['coordinate_type']
+                )
+
+    @property
+    def n_steps(self):
+        return len(self.steps)
+
+    @property
+    def n_atoms(self):
+        return len(self.symbols)
+
+    @property
+    def magnitude(self):
+        """Per-atom force magnitudes (n_steps, n_atoms)."""
+        if self._magnitude is None:
+            self._magnitude = np.linalg.norm(self.forces, axis=2)
+        return self._magnitude
+
+    @property
+    def drift(self):
+        """Total force (sum over atoms) per step (n_steps, 3)."""
+        return self.forces.sum(axis=1)
+
+    @property
+    def stress_diag(self):
+        """Diagonal stress components per step (n_steps, 3), or None."""
+        if self.stress is None:
+            return None
+        return np.diagonal(self.stress, axis1=1, axis2=2)
+
+    @property
+    def pressure(self):
+        """Pressure in kB (negative mean of the stress diagonal) per step, or None."""
+        if self.stress is None:
+            return None
+        return -self.stress_diag.mean(axis=1)
+
+    def step_summary(self):
+        """
+        Per-step summary table computed in one pass over the arrays: one row per step with
+        max/mean force, drift vector and magnitude, energy, and pressure/stress when available.
+        """
+        magnitude = self.magnitude
+        drift = self.drift
+        columns = {
+                'file_source': self.file_source,
+                'step': self.steps,
+                'n_atoms': self.n_atoms,
+                'max_force': magnitude.max(axis=1),
+                'mean_force': magnitude.mean(axis=1),
+                'drift_x': drift[:, 0], 'drift_y': drift[:, 1], 'drift_z': drift[:, 2],
+                'drift': np.linalg.norm(drift, axis=1),
+                'energy': self.energy
+                }
+        if self.stress is not None:
+            diag = self.stress_diag
+            columns['pressure'] = self.pressure
+            columns['stress_xx'] = diag[:, 0]
+            columns['stress_yy'] = diag[:, 1]
+            columns['stress_zz'] = diag[:, 2]
+        return pd.DataFrame(columns)
+
+    def extend(self, other):
+        """
+        Appends the steps of another Trajectory of the same structure (e.g. newly parsed frames).
+        The arrays live in buffers that double their capacity when full, so repeated extends cost
+        time proportional to the appended steps (amortized), not to the trajectory length.
+        """
+        if other.n_steps == 0:
+            return
+        if self.stress is not None or other.stress is not None:
+            if self.stress is None:
+                self.stress = self._stress_or_nan()
+            self._append('stress', other._stress_or_nan())
+        self._append('positions', other.positions)
+        self._append('forces', other.forces)
+        self._append('steps', other.steps)
+        self._append('energy', other.energy)
+        if self._magnitude is not None:
+            self._append('_magnitude', other.magnitude)
+        self._df = None
+
+    def _append(self, name, rows):
+        """Appends rows to the array attribute `name`, which becomes a view of its growing buffer."""
+        current = getattr(self, name)
+        buffer = self._buffers.get(name)
+        n, m = len(current), len(rows)
+        if buffer is None or current.base is not buffer or n + m > len(buffer):
+            buffer = np.empty((max(2 * n, n + m, 16),) + current.shape[1:], dtype=current.dtype)
+            buffer[:n] = current
+            self._buffers[name] = buffer
+        buffer[n:n + m] = rows
+        setattr(self, name, buffer[:n + m])
+
+    def chunks(self, chunk_steps):
+        """Yields consecutive Trajectory views of at most chunk_steps steps (no copies of the arrays)."""
+        for start in range(0, self.n_steps, chunk_steps):
+            window = slice(start, start + chunk_steps)
+            yield Trajectory(
+                    self.positions[window],
+                    self.forces[window],
+                    self.symbols,
+                    steps=self.steps[window],
+                    energy=self.energy[window],
+                    stress=None if self.stress is None else self.stress[window],
+                    file_source=self.file_source,
+                    lattice=self.lattice,
+                    coordinate_type=self.coordinate_type
+                    )
+
+    def _stress_or_nan(self):
+        if self.stress is not None:
+            return self.stress
+        return np.full((self.n_steps, 3, 3), np.nan)
+
+    def to_dataframe(self):
+        """Long-format per-atom DataFrame (one row per atom and step), built lazily and cached."""
+        if self._df is not None:
+            return self._df
+        if self.n_steps == 0:
+            self._df = pd.DataFrame()
+            return self._df
+
+        n_atoms = self.n_atoms
+        positions = self.positions.reshape(-1, 3)
+        forces = self.forces.reshape(-1, 3)
+
+        columns = {
+                'x': positions[:, 0], 'y': positions[:, 1], 'z': positions[:, 2],
+                'fx': forces[:, 0], 'fy': forces[:, 1], 'fz': forces[:, 2],
+                'element': np.tile(self.symbols, self.n_steps),
+                'step': np.repeat(self.steps, n_atoms),
+                'file_source': self.file_source,
+                'energy': np.repeat(self.energy, n_atoms),
+                }
+
+        if self.stress is not None:
+            diag = self.stress_diag
+            columns['pressure'] = np.repeat(self.pressure, n_atoms)
+            columns['stress_xx'] = np.repeat(diag[:, 0], n_atoms)
+            columns['stress_yy'] = np.repeat(diag[:, 1], n_atoms)
+            columns['stress_zz'] = np.repeat(diag[:, 2], n_atoms)
+
+        self._df = pd.DataFrame(columns)
+        return self._df
@@ -1,88 +1,217 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
 import numpy as np
 
+# matplotlib/seaborn are imported inside the methods: the plotting stack (and its GUI backend)
+# only enters the process when a figure is actually drawn, so training can use worker processes.
+
+PLOTS = ('plot_trajectory', 'plot_stress_distribution', 'plot_extended_diagnostics')
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a series sorted by x.
+    Keeps the first and last points and, per bucket, the point spanning the largest triangle
+    with its neighbours, which preserves peaks and the overall shape of the curve.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nlo, nhi = hi, edges[k + 2] if k + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        keep[k + 1] = a
+    return x[keep], y[keep]
+
+def binned_density(values, bins=512):
+    """
+    Density estimate from a fine histogram smoothed with a Gaussian kernel (Scott's bandwidth).
+    Cost is linear in the number of samples, unlike a full KDE.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return np.empty(0), np.empty(0)
+    lo, hi = values.min(), values.max()
+    bandwidth = 1.06 * values.std() * len(values) ** (-1 / 5)
+    pad = 3 * bandwidth
+    counts, edges = np.histogram(values, bins=bins, range=(lo - pad, hi + pad))
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    width = edges[1] - edges[0]
+
+    half = max(int(np.ceil(3 * bandwidth / width)), 1)
+    offsets = np.arange(-half, half + 1) * width
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) if bandwidth > 0 else (offsets == 0).astype(float)
+    density = np.convolve(counts, kernel / kernel.sum(), mode='same') / (len(values) * width)
+    return centers, density
+
+def _render(step_summary, options, name):
+    """Worker: renders one figure to file in a separate process."""
+    getattr(Visualizer(step_summary, **options), name)()
+
 class Visualizer:
-    def __init__(self, dataframe):
-        self.df = dataframe
+    def __init__(self, step_summary, output_dir=None, fmt="png", max_points=2000, kde_threshold=5000):
+        """
+        step_summary: Per-(file, step) summary table (Analyzer.summary)
+        output_dir: If set, figures are written there (non-interactive backend) instead of shown
+        fmt: File format for output_dir ("png", "svg", "pdf")
+        max_points: Series longer than this are downsampled with LTTB before plotting
+        kde_threshold: Above this many samples a binned density replaces the full KDE
+        """
+        if output_dir is not None:
+            import matplotlib
+            matplotlib.use('Agg')
+        import seaborn as sns
+
+        self.step_df = step_summary
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.max_points = max_points
+        self.kde_threshold = kde_threshold
         sns.set_theme(style="whitegrid")
 
+    def _series(self, x, y):
+        return lttb(x, y, self.max_points)
+
+    def _finish(self, name):
+        """Shows the current figure, or saves and closes it in output mode."""
+        import matplotlib.pyplot as plt
+
+        if self.output_dir is None:
+            plt.show()
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{name}.{self.fmt}")
+        plt.savefig(path)
+        plt.close()
+        print(f"Saved {path}")
+
+    def render_all(self, jobs=1):
+        """Draws every diagnostic figure; in output mode with jobs > 1 each figure renders in its own process."""
+        if self.output_dir is None or jobs == 1:
+            for name in PLOTS:
+                getattr(self, name)()
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        options = {'output_dir': self.output_dir, 'fmt': self.fmt,
+                   'max_points': self.max_points, 'kde_threshold': self.kde_threshold}
+        workers = len(PLOTS) if jobs < 0 else min(jobs, len(PLOTS))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render, self.step_df, options, name) for name in PLOTS]
+            for name, future in zip(PLOTS, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error rendering {name}: {e}")
+
     def plot_trajectory(self):
         """Plots Mean Force and Pressure evolution."""
-        # Aggregate by step
-        stats = self.df.groupby('step').agg({
-            'magnitude': 'mean',
-            'pressure': 'first' # Pressure is constant per step
-            })
+        import matplotlib.pyplot as plt
+
+        # Aggregate by step (mean force over all atoms of all files at that step)
+        step_df = self.step_df.assign(force_sum=self.step_df['mean_force'] * self.step_df['n_atoms'])
+        agg = {'force_sum': 'sum', 'n_atoms': 'sum'}
+        if 'pressure' in step_df.columns:
+            agg['pressure'] = 'first' # Pressure is constant per step
+        stats = step_df.groupby('step').agg(agg)
+        stats['magnitude'] = stats['force_sum'] / stats['n_atoms']
 
         fig, ax1 = plt.subplots(figsize=(10, 5))
 
         color = 'tab:blue'
         ax1.set_xlabel('Ionic Step')
         ax1.set_ylabel('Mean Force (eV/A)', color=color)
-        ax1.plot(stats.index, stats['magnitude'], color=color, marker='o', markersize=4)
+        ax1.plot(*self._series(stats.index, stats['magnitude']), color=color, marker='o', markersize=4)
         ax1.tick_params(axis='y', labelcolor=color)
 
         if 'pressure' in stats.columns:
             ax2 = ax1.twinx()
             color = 'tab:red'
             ax2.set_ylabel('Pressure (kB)', color=color)
-            ax2.plot(stats.index, stats['pressure'], color=color, linestyle='--')
+            ax2.plot(*self._series(stats.index, stats['pressure']), color=color, linestyle='--')
             ax2.tick_params(axis='y', labelcolor=color)
 
         plt.title('Force and Pressure Trajectory')
         plt.tight_layout()
-        plt.show()
+        self._finish('trajectory')
 
     def plot_stress_distribution(self):
-        if 'stress_xx' not in self.df.columns: return
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        if 'stress_xx' not in self.step_df.columns: return
 
         # Unique steps only
-        step_df = self.df.drop_duplicates(subset=['step', 'file_source'])
+        step_df = self.step_df
+        components = ['stress_xx', 'stress_yy', 'stress_zz']
 
         plt.figure(figsize=(8, 6))
-        sns.kdeplot(data=step_df[['stress_xx', 'stress_yy', 'stress_zz']], fill=True)
+        if len(step_df) > self.kde_threshold:
+            # Full KDE is O(n * grid); a smoothed histogram gives the same picture in linear time
+            for component in components:
+                centers, density = binned_density(step_df[component])
+                line, = plt.plot(centers, density, label=component)
+                plt.fill_between(centers, density, alpha=0.25, color=line.get_color())
+            plt.legend()
+        else:
+            sns.kdeplot(data=step_df[components], fill=True)
         plt.title("Distribution of Diagonal Stress Components")
         plt.xlabel("Stress (kB)")
-        plt.show()
+        self._finish('stress_distribution')
 
 
     def plot_extended_diagnostics(self):
         """Plots Energy, Drift, and Stress components."""
+        import matplotlib.pyplot as plt
 
         # Aggregate data per step
-        step_df = self.df.drop_duplicates(subset=['step', 'file_source']).sort_values('step')
+        step_df = self.step_df.sort_values('step')
 
         # Calculate Drift per step
-        drift_df = self.df.groupby('step')[['fx', 'fy', 'fz']].sum()
+        drift_df = self.step_df.groupby('step')[['drift_x', 'drift_y', 'drift_z']].sum()
         drift_mags = np.linalg.norm(drift_df.values, axis=1)
 
         # Get energy max/min for each step
-        step_stats = self.df.groupby('step')['energy'].agg(['min', 'max']).reset_index()
+        step_stats = self.step_df.groupby('step')['energy'].agg(['min', 'max']).reset_index()
 
         fig, axes = plt.subplots(3, 1, figsize=(10, 12), sharex=True)
 
         # 1. Energy Plot
         if 'energy' in step_df.columns:
-            axes[0].plot(step_stats['step'], step_stats['max'] - step_stats['max'][0], "-", color='tab:red', linewidth=5, marker='X', markersize=8, label='Rel. Max Energy')
-            axes[0].plot(step_stats['step'], step_stats['min'] - step_stats['min'][0], "-", color='tab:blue', linewidth=5, marker='X', markersize=8, label='Rel. Min Energy')
-            axes[0].plot(step_stats['step'], step_stats['max'] - step_stats['min'] - (step_stats['max'][0] - step_stats['min'][0]), "-", color='tab:green', linewidth=5, marker='X', markersize=8, label='Rel. Energy Range')
+            e_max = step_stats['max'] - step_stats['max'][0]
+            e_min = step_stats['min'] - step_stats['min'][0]
+            e_range = step_stats['max'] - step_stats['min'] - (step_stats['max'][0] - step_stats['min'][0])
+            axes[0].plot(*self._series(step_stats['step'], e_max), "-", color='tab:red', linewidth=5, marker='X', markersize=8, label='Rel. Max Energy')
+            axes[0].plot(*self._series(step_stats['step'], e_min), "-", color='tab:blue', linewidth=5, marker='X', markersize=8, label='Rel. Min Energy')
+            axes[0].plot(*self._series(step_stats['step'], e_range), "-", color='tab:green', linewidth=5, marker='X', markersize=8, label='Rel. Energy Range')
             axes[0].set_ylabel('Energy (eV)')
             axes[0].set_title('Energy Evolution')
             axes[0].legend()
             axes[0].grid(True)
 
         # 2. Drift Plot
-        axes[1].plot(drift_df.index, drift_mags, color='tab:orange', marker='.')
+        axes[1].plot(*self._series(drift_df.index, drift_mags), color='tab:orange', marker='.')
         axes[1].set_ylabel('Total Drift (eV/A)')
         axes[1].set_title('Force Drift (Sum of Forces)')
         axes[1].grid(True)
 
         # 3. Stress Components Plot
         if 'stress_xx' in step_df.columns:
-            axes[2].plot(step_df['step'], step_df['stress_xx'], 'o', label='XX')
-            axes[2].plot(step_df['step'], step_df['stress_yy'], 's', label='YY')
-            axes[2].plot(step_df['step'], step_df['stress_zz'], '^', label='ZZ')
+            axes[2].plot(*self._series(step_df['step'], step_df['stress_xx']), 'o', label='XX')
+            axes[2].plot(*self._series(step_df['step'], step_df['stress_yy']), 's', label='YY')
+            axes[2].plot(*self._series(step_df['step'], step_df['stress_zz']), '^', label='ZZ')
             axes[2].set_ylabel('Stress (kB)')
             axes[2].set_xlabel('Ionic Step')
             axes[2].set_title('Stress Tensor Components')
@@ -90,5 +219,4 @@ class Visualizer:
             axes[2].grid(True)
 
         plt.tight_layout()
-        plt.show()
-
+        self._finish('extended_diagnostics')